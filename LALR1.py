@@ -0,0 +1,196 @@
+"""
+LALR(1) tables built on the LR(0) automaton.
+
+The lookahead sets are computed with the relations of DeRemer and Pennello:
+
+    DR(p, A)     terminals read right after the transition (p, A)
+    reads        (p, A) reads (r, C) if r = goto(p, A) and C derives epsilon
+    includes     (p, A) includes (p', B) if B->βAγ, γ derives epsilon and p' reaches p by β
+    lookback     (q, A->ω) lookback (p, A) if p reaches q by ω
+
+    Read = DR ∪ {Read(r, C) | (p, A) reads (r, C)}
+    Follow = Read ∪ {Follow(p', B) | (p, A) includes (p', B)}
+    LA(q, A->ω) = ∪ {Follow(p, A) | (q, A->ω) lookback (p, A)}
+"""
+
+import debug
+
+from collections import defaultdict
+
+import LRParser
+import LR0
+import LL1
+
+
+def digraph(nodes, relation, base):
+    """
+    Compute F(x) = base(x) | F(y) for every y with x relation y.
+    Nodes in one strongly connected component share the same result.
+
+    The traversal is iterative so that long relation chains do not hit the recursion limit.
+
+    :param nodes: an iterable of nodes
+    :param relation: a dict mapping a node to the nodes it is related to
+    :param base: a dict mapping a node to its initial bitset
+    :return: a dict mapping a node to a bitset
+    """
+
+    infinity = float('inf')
+    depth = {}
+    result = {}
+    stack = []
+    empty = ()
+
+    for root in nodes:
+
+        if root in depth:
+            continue
+
+        stack.append(root)
+        depth[root] = len(stack)
+        result[root] = base.get(root, 0)
+        work = [(root, len(stack), iter(relation.get(root, empty)))]
+
+        while work:
+
+            x, d, successors = work[-1]
+
+            for y in successors:
+                if y not in depth:  # Traverse y first
+                    stack.append(y)
+                    depth[y] = len(stack)
+                    result[y] = base.get(y, 0)
+                    work.append((y, len(stack), iter(relation.get(y, empty))))
+                    break
+
+                depth[x] = min(depth[x], depth[y])
+                result[x] |= result[y]
+            else:
+                work.pop()
+
+                if depth[x] == d:  # x is the root of a strongly connected component
+                    while True:
+                        top = stack.pop()
+                        depth[top] = infinity
+                        result[top] = result[x]
+                        if top == x:
+                            break
+
+                if work:
+                    parent = work[-1][0]
+                    depth[parent] = min(depth[parent], depth[x])
+                    result[parent] |= result[x]
+
+    return result
+
+
+class Lookahead(object):
+    """
+    Compute LA(q, A->ω) for every complete item of an LR(0) automaton.
+    """
+
+    def __init__(self, aug_gram, automaton):
+        self.aug_gram = aug_gram
+        self.automaton = automaton
+        self.analysis = LL1.Analysis(aug_gram)
+
+    def compute(self):
+        """
+
+        :return: a dict mapping (state id, production) to a bitset of terminals
+        """
+
+        aug_gram = self.aug_gram
+        states = self.automaton.states
+        transitions = self.automaton.transitions
+
+        # Transitions on non-terminals are the nodes of both relations
+        nodes = [(p, sym) for p, trans in enumerate(transitions)
+                 for sym in trans if hasattr(sym, 'productions')]
+
+        bits = self.analysis.bits
+        nullable = self.analysis.nullable
+
+        dr = {}
+        reads = {}
+
+        for p, sym in nodes:
+            r = transitions[p][sym]
+
+            dr[(p, sym)] = 0
+            for t in transitions[r]:
+                if not hasattr(t, 'productions'):
+                    dr[(p, sym)] |= bits[t]
+            if any(item.prod == aug_gram.START_PROD and not item.expect() for item in states[r]):
+                dr[(p, sym)] |= bits[aug_gram.END]  # The START production is followed by the endmarker
+
+            reads[(p, sym)] = [(r, t) for t in transitions[r] if nullable.get(t, False)]
+
+        read = digraph(nodes, reads, dr)
+
+        includes = defaultdict(list)
+        lookback = defaultdict(list)
+
+        for p, head in nodes:
+            for prod in head.productions:
+
+                suffix = self.analysis.suffix[prod]
+
+                state = p
+                for i, sym in enumerate(prod):
+                    if hasattr(sym, 'productions') and suffix[i + 1][1]:
+                        includes[(state, sym)].append((p, head))
+                    state = transitions[state][sym]
+
+                lookback[(state, prod)].append((p, head))
+
+        follow = digraph(nodes, includes, read)
+
+        la = {}
+        for key, sources in lookback.items():
+            la[key] = 0
+            for src in sources:
+                la[key] |= follow[src]
+
+        return la
+
+
+class Parser(LR0.Parser):
+    """
+    LALR(1) parser.
+
+    States of the canonical LR(1) collection that share a core are merged, which may introduce
+    reduce/reduce conflicts. They are collected by LRParser.fill like any other conflict.
+    """
+
+    def construct(self, aug_gram):
+
+        automaton = LR0.Automaton(LR0.Operation(), LR0.Item(aug_gram.START_PROD, 0))
+
+        lookahead = Lookahead(aug_gram, automaton)
+        self.analysis = lookahead.analysis
+        self.la = lookahead.compute()
+
+        self.fill(aug_gram, automaton)
+
+        return 0
+
+    def lookahead(self, state, item):
+        return self.analysis.decode(self.la.get((state, item.prod), 0))
+
+
+@debug.log_attr(msg='MAIN', log_obj=True)
+def main():
+    import LR1
+
+    filename = './test-input/test-LR1-input_RE.txt'
+    g = LRParser.AugmentedGrammarBuilder(filename=filename).build()
+
+    lalr = Parser(g)
+    lr1 = LR1.Parser(g)
+
+    return 'LALR(1) states: %d, LR(1) states: %d' % (len(lalr.states), len(lr1.states))
+
+
+if __name__ == '__main__':
+    main()
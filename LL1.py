@@ -1,64 +1,190 @@
 import itertools
 
 import debug
+import LRParser
 
+from array import array
+from collections import defaultdict, deque
 
-class Operation(object):
+# Entry of the predictive table without any production
+NO_PRODUCTION = -1
 
-    def __init__(self): # TODO Implement FIRST and FOLLOW
-        self._first = {}
-        self._follow = {}
-        self._derive_epsilon = {}
 
-    # TODO this impl returns True on derive_epsilon(seq=())
-    #@debug.log_attr(msg='derive_epsilon')
-    def derive_epsilon(self, *symbols, seq=()):
-        """
-        Check if the given symbols can derive epsilon.
+class Analysis(object):
+    """
+    Compute nullable, FIRST and FOLLOW of every non-terminal in one pass over the whole grammar.
+
+    Sets of terminals are integer bitsets: bit i stands for self.terminals[i],
+    so FIRST(βa) is a few OR operations.
+    """
+
+    def __init__(self, gram):
+        self.terminals = list(gram.terminals())
+        self.bits = {sym: 1 << i for i, sym in enumerate(self.terminals)}
+
+        self.nullable = {nt: False for nt in gram.nterminals()}
+        self.first = {nt: 0 for nt in gram.nterminals()}
+        self.follow = {nt: 0 for nt in gram.nterminals()}
 
+        productions = gram.productions()
+
+        self.compute_first(productions)
+
+        # For every production, (FIRST, nullable) of the suffix of its body starting at each position
+        self.suffix = {prod: self.suffixes(prod) for prod in productions}
+
+        self.compute_follow(gram, productions)
+
+    def first_seq(self, symbols):
+        """
+        FIRST of a sequence of symbols.
 
         :param symbols:
-        :return: True when the all symbols in a given sequence derive epsilon
+        :return: a bitset and True if all the symbols derive epsilon
+        """
+
+        bits = 0
+        for sym in symbols:
+            if sym in self.nullable:  # Non-terminal
+                bits |= self.first[sym]
+                if not self.nullable[sym]:
+                    return bits, False
+            else:
+                return bits | self.bits[sym], False
+
+        return bits, True
+
+    def suffixes(self, prod):
+        """
+
+        :param prod:
+        :return: a list of (bitset, nullable) where the i-th item describes prod[i:]
+        """
+
+        result = [(0, True)] * (len(prod) + 1)
+
+        bits, nullable = 0, True
+        for i in range(len(prod) - 1, -1, -1):
+            sym = prod[i]
+            if sym in self.nullable:
+                bits = self.first[sym] | (bits if self.nullable[sym] else 0)
+                nullable = nullable and self.nullable[sym]
+            else:
+                bits, nullable = self.bits[sym], False
+            result[i] = (bits, nullable)
+
+        return result
+
+    def compute_first(self, productions):
+        """
+        Worklist fixpoint of nullable and FIRST.
+        A production is examined again only when FIRST or nullable of a symbol in its body changes.
+
+        :param productions:
+        :return:
+        """
+
+        users = {nt: [] for nt in self.nullable}  # Productions having the non-terminal in their bodies
+        for i, prod in enumerate(productions):
+            for sym in set(prod.body):
+                if sym in users:
+                    users[sym].append(i)
+
+        work = deque(range(len(productions)))
+        waiting = set(work)
+
+        while work:
+            i = work.popleft()
+            waiting.discard(i)
+
+            prod = productions[i]
+            head = prod.head
+            bits, nullable = self.first_seq(prod)
+
+            if bits & ~self.first[head] or (nullable and not self.nullable[head]):
+                self.first[head] |= bits
+                self.nullable[head] = self.nullable[head] or nullable
+
+                for j in users[head]:
+                    if j not in waiting:
+                        waiting.add(j)
+                        work.append(j)
+
+    def compute_follow(self, gram, productions):
+        """
+        Worklist fixpoint of FOLLOW: the endmarker follows the START symbol, and for A->αBβ,
+        FOLLOW(B) contains FIRST(β) and also FOLLOW(A) if β derives epsilon.
+
+        :param gram:
+        :param productions:
+        :return:
+        """
+
+        follow = self.follow
+        follow[gram.START] |= self.bits[gram.END]
+
+        feeds = {nt: set() for nt in follow}  # FOLLOW(A) is contained in FOLLOW(B) for B in feeds[A]
+
+        for prod in productions:
+            suffix = self.suffix[prod]
+            for i, sym in enumerate(prod):
+                if sym in follow:
+                    bits, nullable = suffix[i + 1]
+                    follow[sym] |= bits
+                    if nullable and sym != prod.head:
+                        feeds[prod.head].add(sym)
+
+        work = deque(follow)
+        waiting = set(work)
+
+        while work:
+            nt = work.popleft()
+            waiting.discard(nt)
+
+            for sym in feeds[nt]:
+                if follow[nt] & ~follow[sym]:
+                    follow[sym] |= follow[nt]
+                    if sym not in waiting:
+                        waiting.add(sym)
+                        work.append(sym)
+
+    def decode(self, bits):
         """
+        Convert a bitset into a list of terminals.
 
-        _de = self._derive_epsilon
-        waiting = set()  # Non-terminals waiting to be checked.
+        :param bits:
+        :return:
+        """
 
-        def recur(sym):
-            """
-            Recursively check if a symbol can derive epsilon.
+        result = []
+        i = 0
+        while bits:
+            if bits & 1:
+                result.append(self.terminals[i])
+            bits >>= 1
+            i += 1
+
+        return result
 
-            :param sym:
-            :return: True when the all symbols in a given sequence derive epsilon
-            """
 
-            if sym not in _de:
-                productions = getattr(sym, 'productions', None)
+class Operation(object):
+    """
+    FIRST, FOLLOW and epsilon derivation on symbols, answered from an Analysis of the grammar.
+    """
 
-                if productions:  # Non-terminal
-                    waiting.add(sym)  # In case of recursion
+    def __init__(self, gram):
+        self.analysis = Analysis(gram)
 
-                    for prod in productions:
-                        #
-                        # TODO What if temp is an empty list?
-                        # A->ABC|B while A, B and C are waiting
-                        #
-                        temp = [subsym for subsym in prod if subsym not in waiting]
-                        if all(map(recur, temp)):
-                            _de[sym] = True
-                            break
-                    if sym not in _de:  # Assertion: if sym in _de, _de[sym] must be true
-                        _de[sym] = False
+    def derive_epsilon(self, *symbols, seq=()):
+        """
+        Check if the given symbols can derive epsilon.
 
-                    waiting.discard(sym)  # Remember to remove it from the waiting set
-                else:
-                    _de[sym] = False  # For terminal it's always False
+        :param symbols:
+        :return: True when the all symbols in a given sequence derive epsilon
+        """
 
-            return _de[sym]
-        assert not waiting  # TODO Assertion
-        return all([recur(sym) for sym in itertools.chain(symbols, seq)])
+        return self.analysis.first_seq(itertools.chain(symbols, seq))[1]
 
-    #@debug.log_attr(msg='first')
     def first(self, *symbols, seq=()):
         """
         Performt the FIRST operation -> FIRST(α)
@@ -66,72 +192,267 @@ class Operation(object):
         :param symbols: a sequence of grammar symbols
         :return: a set of symbols
         """
-        _fst = self._first
 
-        def recur(sym):
-            """
-            Recursively calculate FIRST(α)
+        return set(self.analysis.decode(self.analysis.first_seq(itertools.chain(symbols, seq))[0]))
+
+    def follow(self, *symbols, seq=()):
+        """
+        Perform the FOLLOW operation on non-terminals.
+
+        :param symbols: non-terminals
+        :return: the union of their FOLLOW sets
+        """
 
-            :param sym: α
-            :return: a set of symbols
-            """
-            if sym not in _fst:
+        bits = 0
+        for sym in itertools.chain(symbols, seq):
+            bits |= self.analysis.follow[sym]
 
-                productions = getattr(sym, 'productions', None)
+        return set(self.analysis.decode(bits))
 
-                if productions:  # Non-terminal
-                    _fst[sym] = set()
 
-                    for prod in productions:
-                        for subsym in prod:
+class Parser(object):
+    """
+    Table-driven LL(1) parser.
 
-                            _fst[sym] |= recur(subsym)
+    Terminals, non-terminals and productions are numbered like in LRParser. The parse stack is an
+    array('i') of symbols: a terminal id t stands for itself and a non-terminal id n for -n - 1.
+    self.table[nt][t] is the production expanding nt on the lookahead t, or NO_PRODUCTION.
+    self.rbodies[p] is the body of the production p encoded and reversed, so an expansion
+    is one pop and one extend.
 
-                            if not self.derive_epsilon(subsym):
-                                break
+    Conflicts, the entries predicting more than one production, are all collected in
+    self.conflicts and reported together.
+    """
 
-                else:  # Terminal
-                    _fst[sym] = {sym}
+    def __init__(self, gram):
+        self.analysis = Analysis(gram)
 
-            return _fst[sym]
+        self.terminals = list(gram.terminals())
+        self.nterminals = list(gram.nterminals())
+        self.productions = gram.productions()
+        self.pid = gram.production_ids()
 
-        result = set()
-        for sym in itertools.chain(symbols, seq):
+        self.tid = {sym: i for i, sym in enumerate(self.terminals)}
+        self.ntid = {sym: i for i, sym in enumerate(self.nterminals)}
 
-            result |= recur(sym)
+        self.start = self.ntid[gram.START]
+        self.end = self.tid[gram.END]
 
-            if not self.derive_epsilon(sym):
-                break
+        self.rbodies = [array('i', [self.code(sym) for sym in reversed(prod.body)]) for prod in self.productions]
+        self.rhslen = array('i', [len(prod) for prod in self.productions])
+        self.semantics = [None] * len(self.productions)
+        self.table = [array('i', [NO_PRODUCTION]) * len(self.terminals) for _ in self.nterminals]
 
-        return result
+        self.conflicts = self.fill()
 
-    # TODO stub method
-    def follow(self, *symbols, seq=()):
-        raise NotImplementedError
+        if self.conflicts:
+            raise LRParser.ParseError('LL(1) conflicts found:\n' + '\n'.join(
+                '%s on %s: %s' % (nt, sym, ', '.join(map(str, prods)))
+                for nt, sym, prods in self.conflicts
+            ), -1)
+
+    def code(self, sym):
+        """
+
+        :param sym: a grammar symbol
+        :return: its encoding on the parse stack
+        """
+
+        if sym in self.ntid:
+            return -self.ntid[sym] - 1
+        return self.tid[sym]
+
+    def predict(self, prod):
+        """
+        The lookaheads on which a production is chosen: FIRST of its body,
+        and FOLLOW of its head if the body derives epsilon.
+
+        :param prod:
+        :return: a bitset
+        """
+
+        bits, nullable = self.analysis.suffix[prod][0]
+        if nullable:
+            bits |= self.analysis.follow[prod.head]
+        return bits
+
+    def fill(self):
+        """
+        Fill the predictive table.
+
+        :return: a list of (non-terminal, terminal, productions) for every conflict
+        """
+
+        predictions = defaultdict(list)
+
+        for p, prod in enumerate(self.productions):
+            row = self.table[self.ntid[prod.head]]
+
+            for sym in self.analysis.decode(self.predict(prod)):
+                predictions[prod.head, sym].append(prod)
+                row[self.tid[sym]] = p
+
+        return [(nt, sym, prods) for (nt, sym), prods in predictions.items() if len(prods) > 1]
+
+    def semantic(self, prod, func):
+        """
+        Register the semantic action of a production, see LRParser.semantic.
+
+        :param prod: a Production object of the grammar
+        :param func: a callable, or None to remove the action
+        :return:
+        """
+
+        self.semantics[self.pid[prod]] = func
+
+    def parse(self, symbols):
+        """
+        Should be fed a symbols sequence terminated with an endmarker.
+
+        :param symbols: an iterable objcect teminated with an endmarker
+        :return: a ParseResult object, errno is 0 for success
+        """
+
+        return self.drive(LRParser.ids(self.tid, symbols))
+
+    def drive(self, tokens):
+        """
+        The predictive loop over terminal ids, without recursion.
+
+        :param tokens: an iterable of terminal ids teminated with the id of the endmarker
+        :return: a ParseResult object, errno is 0 for success
+        """
+
+        table = self.table
+        rbodies = self.rbodies
+        end = self.end
+
+        stack = array('i', [end, -self.start - 1])
+        pos = 0
+
+        for t in tokens:
+            if t < 0:
+                return LRParser.ParseResult('Unknown symbol.', -1, pos)
+            while True:
+                top = stack[-1]
+
+                if top >= 0:  # MATCH
+                    if top != t:
+                        return LRParser.ParseResult('Unexpected symbol.', -1, pos)
+                    stack.pop()
+                    if t == end:
+                        return LRParser.ParseResult('Accepted.', 0, pos)
+                    break
+
+                p = table[-top - 1][t]  # EXPAND
+                if p == NO_PRODUCTION:
+                    return LRParser.ParseResult('No such production.', -1, pos)
+                stack.pop()
+                stack.extend(rbodies[p])
+            pos += 1
+
+        return LRParser.ParseResult('Unexpected end of input.', -1, pos)
+
+    def evaluate(self, symbols, values=None):
+        """
+        The loop of self.drive recording every expansion and every match, after which the semantic
+        actions are run over the record backwards: the children of an expansion are then all
+        evaluated before it is reached, the leftmost one on the top of the value stack.
+
+        :param symbols: an iterable objcect teminated with an endmarker
+        :param values: the value of every symbol, the symbols themselves by default
+        :return: a ParseResult object whose value is that of the start symbol
+        """
+
+        symbols = list(symbols)
+        values = symbols if values is None else list(values)
+
+        table = self.table
+        rbodies = self.rbodies
+        end = self.end
+
+        stack = array('i', [end, -self.start - 1])
+        record = array('i')  # A production id for an expansion, -1 - pos for a match
+        pos = 0
+
+        for t in LRParser.ids(self.tid, symbols):
+            if t < 0:
+                return LRParser.ParseResult('Unknown symbol.', -1, pos)
+            while True:
+                top = stack[-1]
+
+                if top >= 0:  # MATCH
+                    if top != t:
+                        return LRParser.ParseResult('Unexpected symbol.', -1, pos)
+                    stack.pop()
+                    if t == end:
+                        return LRParser.ParseResult('Accepted.', 0, pos, self.replay(record, values))
+                    record.append(-1 - pos)
+                    break
+
+                p = table[-top - 1][t]  # EXPAND
+                if p == NO_PRODUCTION:
+                    return LRParser.ParseResult('No such production.', -1, pos)
+                stack.pop()
+                stack.extend(rbodies[p])
+                record.append(p)
+            pos += 1
+
+        return LRParser.ParseResult('Unexpected end of input.', -1, pos)
+
+    def replay(self, record, values):
+        """
+        Run the semantic actions over a record of self.evaluate.
+        Without an action the value of the head is that of the first body symbol, or None.
+
+        :param record: the expansions and the matches in the order they were made
+        :param values: the value of every symbol
+        :return: the value of the start symbol
+        """
+
+        rhslen = self.rhslen
+        semantics = self.semantics
+        vstack = []
+
+        for code in reversed(record):
+            if code < 0:
+                vstack.append(values[-1 - code])
+                continue
+
+            n = rhslen[code]
+            func = semantics[code]
+            if n:
+                args = vstack[-n:]
+                del vstack[-n:]
+                args.reverse()
+                vstack.append(func(*args) if func else args[0])
+            else:
+                vstack.append(func() if func else None)
+
+        return vstack[-1]
 
 
 @debug.log_attr(msg='main', log_obj=True)
 def main():
     from grammar import GrammarBuilder
 
-    with open('test-input/test-LL1.txt') as f:
-        inputs = [line.split() for line in f]
-
-    for index, arg in enumerate(inputs):
-
-        fn, *_ = arg
+    for index, fn in enumerate(['test-input/test-LR0-input_3.txt', 'test-input/grammar0.txt']):
 
         print('Test %d:' % index)
         g = GrammarBuilder(filename=fn).build()
-        op = Operation()
+        op = Operation(g)
 
         for nt in g.nterminals():
-            print(nt)
-            op.derive_epsilon(nt)
+            print(nt, op.derive_epsilon(nt), op.first(nt), op.follow(nt))
 
-        for nt in g.nterminals():
-            print(nt)
-            op.first(nt)
+        try:
+            parser = Parser(g)
+        except LRParser.ParseError as e:
+            print(e.msg)
+            continue
+
+        for string in ['abab', 'bb', 'aab', 'ba']:
+            print(string, parser.parse([g.T[c] for c in string] + [g.END]))
 
     return 'Main finished.'
 
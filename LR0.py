@@ -1,5 +1,6 @@
 import debug
 import LRParser
+import LL1
 
 from collections import deque
 from itertools import chain
@@ -8,15 +9,23 @@ DOT = '@'
 
 
 class Item(object):
+    """
+    The symbol after the dot and the hash value are computed once,
+    so that building millions of items in item sets stays cheap.
+    """
+
+    __slots__ = ('prod', 'pos', '_expect', '_hash')
 
     def __init__(self, prod, pos):
         self.prod = prod
         self.pos = pos
+        self._expect = prod.body[pos] if pos < len(prod.body) else None
+        self._hash = hash((prod.id, pos))
 
     def expect(self):
         """Return the symbolize after the dot notation"""
 
-        return self.prod[self.pos] if self.pos < len(self.prod) else None
+        return self._expect
 
     def __key_data(self):
         """
@@ -45,10 +54,12 @@ class Item(object):
 
     # Both __hash__ and __eq__ are necessary for set
     def __hash__(self):
-        return hash(self.__key_data())
+        return self._hash
 
     def __eq__(self, other):
-        return isinstance(other, Item) and self.__key_data() == other.__key_data()
+        if self is other:
+            return True
+        return isinstance(other, Item) and self._hash == other._hash and self.__key_data() == other.__key_data()
 
     def __ne__(self, other):
         return not self.__eq__(other)
@@ -57,8 +68,13 @@ class Item(object):
 class ItemSet(object):
     """
     Immutable item set.
+
+    A state of an automaton is identified and stored by its kernel items only,
+    see Operation.closure for the full item set.
     """
 
+    __slots__ = ('items',)
+
     # TODO Shall I make it a subclass of frozenset?
     def __init__(self, iterable):
         """
@@ -104,6 +120,25 @@ class Operation(object):
     Build LR(0) item set.
     """
 
+    def __init__(self, *args, **kwargs):
+        super(Operation, self).__init__(*args, **kwargs)
+        self._nclosure = {}
+        self._items = {}
+
+    def item(self, prod, pos):
+        """
+        Return the interned item (prod, pos), so that item sets share their items.
+
+        :param prod:
+        :param pos:
+        :return: item
+        """
+
+        k = (prod, pos)
+        if k not in self._items:
+            self._items[k] = Item(prod, pos)
+        return self._items[k]
+
     def pending(self, item):
         """
         Construct a collection of items by placing the dot notation at the
@@ -115,7 +150,7 @@ class Operation(object):
         :return: the items constructed DIRECTLY from the non-terminal
         """
 
-        return [Item(prod, 0) for prod in getattr(item.expect(), 'productions', ())]
+        return [self.item(prod, 0) for prod in getattr(item.expect(), 'productions', ())]
 
     def advance(self, item):
         """
@@ -126,7 +161,7 @@ class Operation(object):
         :return: item
         """
 
-        return item.expect() and Item(item.prod, item.pos + 1)
+        return item.expect() and self.item(item.prod, item.pos + 1)
 
     def eclosure(self, *items, iterable=()):
         """
@@ -151,79 +186,176 @@ class Operation(object):
 
         return ItemSet(seen)
 
+    def nclosure(self, sym):
+        """
+        The items contributed to a closure by a non-terminal, computed once for each non-terminal.
+
+        :param sym: a non-terminal
+        :return: a list of items
+        """
+
+        if sym not in self._nclosure:
+            self._nclosure[sym] = list(self.eclosure(iterable=[self.item(prod, 0) for prod in sym.productions]))
+
+        return self._nclosure[sym]
+
+    def closure(self, kernel):
+        """
+        Build the full item set of a kernel from the cached closures of non-terminals.
+
+        :param kernel: an iterable of kernel items
+        :return: a list of items
+        """
+
+        items = list(kernel)
+        seen = set(items)
+
+        for sym in {item.expect() for item in items}:
+            if hasattr(sym, 'productions'):
+                for item in self.nclosure(sym):
+                    if item not in seen:
+                        seen.add(item)
+                        items.append(item)
+
+        return items
+
     def goto(self, src, sym):
         """
         Perform the goto operation starting from an item set through a given symbol
 
-        :param src: current state
+        :param src: the full item set of current state
         :param sym: symbol
-        :return: item set
+        :return: the kernel of the next item set
         """
 
-        return self.eclosure(iterable=[self.advance(t) for t in src if t.expect() == sym])
+        return ItemSet([self.advance(t) for t in src if t.expect() == sym])
 
+    def partition(self, src):
+        """
+        Perform the goto operation through every symbol at once.
+        The items are bucketed by the symbol after the dot in a single pass.
 
-class Parser(LRParser.LRParser):
+        :param src: the full item set of current state
+        :return: a dict mapping a symbol to the kernel of the next item set
+        """
 
-    def construct(self, aug_gram):
+        buckets = {}
 
-        op = Operation()
-        start = op.eclosure(Item(aug_gram.START_PROD, 0))
-        states = set()
+        for item in src:
+            sym = item.expect()
+            if sym:
+                if sym in buckets:
+                    buckets[sym].append(self.advance(item))
+                else:
+                    buckets[sym] = [self.advance(item)]
 
-        que = deque(iterable=(start,))
+        return {sym: ItemSet(items) for sym, items in buckets.items()}
 
-        while que:
 
-            curr = que.popleft()
-            states.add(curr)
+class Automaton(object):
+    """
+    The collection of item sets reachable from the start item.
 
-            seen = set()
+    Item sets are numbered in the order they are discovered, so the start set is always 0.
+    self.states[i] is the kernel of an item set, whose full closure is built only while it is expanded.
+    self.transitions[i] maps a symbol to the id of the item set reached from self.states[i].
+    self.reductions[i] lists the complete items of the item set.
+    """
 
-            for item in curr:
+    def __init__(self, op, start):
+        """
 
-                symbol = item.expect()
+        :param op: an Operation object building the item sets
+        :param start: the start item
+        """
+
+        start = ItemSet((start,))
+
+        self.states = [start]
+        self.transitions = []
+        self.reductions = []
+
+        index = {start: 0}  # Map every item set to its state id
+
+        while len(self.transitions) < len(self.states):
+
+            closure = op.closure(self.states[len(self.transitions)])
+            trans = {}
+
+            for symbol, next in self.successors(op, closure).items():
+
+                if next not in index:
+                    index[next] = len(self.states)
+                    self.states.append(next)  # Append the next state to the queue
 
-                if not symbol:
-                    # The item that leads to accepted state may be grouped together with other items.
-                    # That means a combination such as {S->E@#, E->E@+T, E->E@-T} is also possible.
+                trans[symbol] = index[next]
 
-                    if item.prod == aug_gram.START_PROD:  # For the accepted state
-                        self.setaction(curr, aug_gram.END, self.accept)
-                    else:
-                        for symbol in aug_gram.terminals():
-                            self.setaction(curr, symbol, self.reduce, item.prod)
+            self.transitions.append(trans)
+            self.reductions.append([item for item in closure if not item.expect()])
 
-                elif symbol not in seen:
+    def successors(self, op, closure):
+        """
+
+        :param op:
+        :param closure: the full item set of the state being expanded
+        :return: a dict mapping a symbol to the kernel of the next item set
+        """
+
+        return op.partition(closure)
+
+    def __len__(self):
+        return self.states.__len__()
 
-                    seen.add(symbol)
-                    next = op.goto(curr, symbol)
 
-                    if next not in states:
-                        que.append(next)  # Append the next state to the queue
+class Parser(LRParser.LRParser):
 
-                    if hasattr(symbol, 'productions'):
-                        self.setgoto(curr, symbol, next)  # For terminals,
-                    else:
-                        self.setaction(curr, symbol, self.shift, next) # For non-terminals,
+    def construct(self, aug_gram):
 
-        return start
+        self.fill(aug_gram, Automaton(Operation(), Item(aug_gram.START_PROD, 0)))
+
+        return 0
+
+    def lookahead(self, state, item):
+        """
+        LR(0) reduces on every terminal.
+        """
+
+        return self.terminals
+
+
+class SLRParser(Parser):
+    """
+    SLR(1) parser: a complete item A->α@ is reduced only on the terminals in FOLLOW(A).
+    """
+
+    def construct(self, aug_gram):
+
+        self.analysis = LL1.Analysis(aug_gram)
+
+        return Parser.construct(self, aug_gram)
+
+    def lookahead(self, state, item):
+        return self.analysis.decode(self.analysis.follow[item.prod.head])
 
 
 @debug.log_attr(msg='MAIN')
 def main():
+    import cache
 
     with open('test-input/test-LR0.txt') as f:
         inputs = [line.split() for line in f]
 
+    parsers = {}  # Every grammar is loaded once
+
     passed = 0
     for index, arg in enumerate(inputs):
         fn, *string = arg
 
         print('Test %d:' % index)
 
-        g = LRParser.AugmentedGrammarBuilder(filename=fn).build()
-        parser = Parser(g)
+        if fn not in parsers:
+            parsers[fn] = cache.load(fn, 'lr0')
+        g, parser = parsers[fn]
 
         symbols = [g.T[c] for c in string]
         symbols.append(g.END)
@@ -14,16 +14,25 @@ import LL1
 
 class Item(LR0.Item):
 
+    __slots__ = ('lookahead',)
+
     def __init__(self, prod, pos, lookahead):
+        """
+
+        :param prod:
+        :param pos:
+        :param lookahead: a bitset of terminals, see LL1.Analysis
+        """
         assert lookahead
         super(Item, self).__init__(prod , pos)
-        self.lookahead = frozenset(lookahead)
+        self.lookahead = lookahead
+        self._hash = hash((prod.id, pos, lookahead))
 
     def __key_data(self):
         return self.prod, self.pos, self.lookahead
 
     def __str__(self):
-        return '%s, %s' % (LR0.Item.__str__(self), '/'.join(map(str, self.lookahead)))
+        return '%s, %s' % (LR0.Item.__str__(self), bin(self.lookahead))
 
     def rear(self):
         """
@@ -39,21 +48,44 @@ class Operation(LR0.Operation, LL1.Operation):
     Build LR(1) item set.
     """
 
-    def pending(self, item):
-        symbols = item.rear()
+    def __init__(self, gram):
+        super(Operation, self).__init__(gram)
 
-        lookahead = self.first(seq=symbols)
+        # A bit beyond all the terminals, standing for the lookahead of the item being closed
+        self.mark = 1 << len(self.analysis.terminals)
 
-        if self.derive_epsilon(seq=symbols):
-            lookahead |= item.lookahead
+    def item(self, prod, pos, lookahead):
+        """
+        Return the interned item (prod, pos, lookahead), so that item sets share their items.
+
+        :param prod:
+        :param pos:
+        :param lookahead:
+        :return: item
+        """
 
+        k = (prod, pos, lookahead)
+        if k not in self._items:
+            self._items[k] = Item(prod, pos, lookahead)
+        return self._items[k]
+
+    def pending(self, item):
         productions = getattr(item.expect(), 'productions', ())
 
-        return map(lambda prod: Item(prod, 0, lookahead), productions)
+        if not productions:
+            return ()
+
+        # FIRST(βa) of the item A->α@Bβ, a
+        lookahead, nullable = self.analysis.suffix[item.prod][item.pos + 1]
+
+        if nullable:
+            lookahead |= item.lookahead
+
+        return [self.item(prod, 0, lookahead) for prod in productions]
 
     def advance(self, item):
 
-        return Item(item.prod, item.pos+1, item.lookahead)
+        return self.item(item.prod, item.pos + 1, item.lookahead)
 
     def eclosure(self, *items, iterable=()):
         """
@@ -66,8 +98,8 @@ class Operation(LR0.Operation, LL1.Operation):
 
         # queue consist of items
         queue = deque(itertools.chain(items, iterable))
-        # use the (prod, pos) as key, set of symbols as value
-        seen = defaultdict(set)
+        # use the (prod, pos) as key, bitset of symbols as value
+        seen = defaultdict(int)
 
         while queue:
             curr = queue.popleft()
@@ -78,64 +110,213 @@ class Operation(LR0.Operation, LL1.Operation):
 
                 known = seen.get(next.raw_tuple(), None)
 
-                if not known or not known.issuperset(next.lookahead):
+                if known is None or next.lookahead & ~known:
                     queue.append(next)
 
-        return LR0.ItemSet(map(lambda kv: Item(*kv[0], kv[1]), seen.items()))
+        return LR0.ItemSet(map(lambda kv: self.item(*kv[0], kv[1]), seen.items()))
+
+    def nclosure(self, sym):
+        """
+        The items contributed to a closure by a non-terminal, computed once for each non-terminal.
+
+        The closure is computed with self.mark as the lookahead. An item whose lookahead
+        has the mark receives the lookahead of the item A->α@Bβ being closed, that is FIRST(βa).
+
+        :param sym: a non-terminal
+        :return: a list of (prod, bitset)
+        """
+
+        if sym not in self._nclosure:
+            items = self.eclosure(iterable=[self.item(prod, 0, self.mark) for prod in sym.productions])
+            self._nclosure[sym] = [(item.prod, item.lookahead) for item in items]
+
+        return self._nclosure[sym]
+
+    def closure(self, kernel):
+        """
+        Build the full item set of a kernel from the cached closures of non-terminals.
+
+        :param kernel: an iterable of kernel items
+        :return: a list of items
+        """
+
+        mark = self.mark
+        suffix = self.analysis.suffix
+
+        items = {item.raw_tuple(): item.lookahead for item in kernel}
+
+        for item in list(kernel):
+            sym = item.expect()
+            if not hasattr(sym, 'productions'):
+                continue
+
+            lookahead, nullable = suffix[item.prod][item.pos + 1]
+            if nullable:
+                lookahead |= item.lookahead
+
+            for prod, bits in self.nclosure(sym):
+                if bits & mark:
+                    bits = bits & ~mark | lookahead
+                k = (prod, 0)
+                items[k] = items.get(k, 0) | bits
+
+        return [self.item(*k, la) for k, la in items.items()]
 
 
 class Parser(LRParser.LRParser):
 
     def construct(self, aug_gram):
 
-        op = Operation()
-        start = op.eclosure(Item(aug_gram.START_PROD, 0, {aug_gram.END}))
-        states = {start}
+        self.op = Operation(aug_gram)
+        start = self.op.item(aug_gram.START_PROD, 0, self.op.analysis.bits[aug_gram.END])
+
+        self.fill(aug_gram, LR0.Automaton(self.op, start))
+
+        return 0
+
+    def lookahead(self, state, item):
+        return self.op.analysis.decode(item.lookahead)
+
+
+class MinimalAutomaton(object):
+    """
+    LR(1) automaton built with Pager's weak compatibility test.
+
+    A new state is merged into an existing one with the same core while building, unless merging
+    could introduce a reduce/reduce conflict that the canonical collection does not have.
+    The tables accept exactly the language of the canonical LR(1) tables.
+
+    Provides states, transitions and reductions like LR0.Automaton.
+    """
+
+    def __init__(self, op, start):
+        """
+
+        :param op: an Operation object building LR(1) item sets
+        :param start: the start item
+        """
+
+        # A kernel maps (prod, pos) to its lookahead
+        kernels = [{start.raw_tuple(): start.lookahead}]
+        reductions = [None]
+        transitions = [{}]
+        cores = defaultdict(list)  # Map a core to the ids of the states having it
+        cores[frozenset(kernels[0])].append(0)
+
+        que = deque((0,))
+        queued = {0}
 
-        que = deque(iterable=(start,))
         while que:
 
             curr = que.popleft()
-            states.add(curr)
+            queued.discard(curr)
 
-            seen = set()  # Record the symbols checked following dot notation in one ItemSet
-
-            for item in curr:
+            closure = op.closure([op.item(*k, la) for k, la in kernels[curr].items()])
+            reductions[curr] = [item for item in closure if not item.expect()]
 
+            succ = defaultdict(lambda: defaultdict(int))  # Successor kernels by symbol
+            for item in closure:
                 symbol = item.expect()
+                if symbol:
+                    succ[symbol][(item.prod, item.pos + 1)] |= item.lookahead
+
+            for symbol, kernel in succ.items():
+
+                for next in cores[frozenset(kernel)]:
+                    known = kernels[next]
+
+                    if self.compatible(known, kernel):
+                        if any(kernel[k] & ~known[k] for k in kernel):
+                            # The merged state has to be expanded again to propagate the new lookaheads
+                            kernels[next] = {k: known[k] | kernel[k] for k in known}
+                            if next not in queued:
+                                que.append(next)
+                                queued.add(next)
+                        break
+                else:
+                    next = len(kernels)
+                    kernels.append(dict(kernel))
+                    reductions.append(None)
+                    transitions.append({})
+                    cores[frozenset(kernel)].append(next)
+                    que.append(next)
+                    queued.add(next)
+
+                transitions[curr][symbol] = next
+
+        self.compact(op, kernels, reductions, transitions)
+
+    @staticmethod
+    def compatible(k1, k2):
+        """
+        Pager's weak compatibility test of two kernels with the same core.
 
-                if not symbol:
-                    # The item that leads to accepted state may be grouped together with other items.
-                    # That means a combination such as {S->E@#, E->E@+T, E->E@-T} is also possible.
+        For every pair of items i and j, either merging does not bring their lookaheads together
+        or they already share a lookahead in one of the kernels.
 
-                    if item.prod == aug_gram.START_PROD:  # For the accepted state
-                        self.setaction(curr, aug_gram.END, self.accept)
-                    else:
-                        for symbol in item.lookahead:
-                            self.setaction(curr, symbol, self.reduce, item.prod)
+        :param k1:
+        :param k2:
+        :return: True if the kernels can be merged
+        """
 
-                elif symbol not in seen:
+        keys = list(k1)
 
-                    seen.add(symbol)
-                    next = op.goto(curr, symbol)
+        for i, ki in enumerate(keys):
+            for kj in keys[i + 1:]:
+                if (k1[ki] & k2[kj] or k2[ki] & k1[kj]) and not (k1[ki] & k1[kj] or k2[ki] & k2[kj]):
+                    return False
 
-                    if next not in states:
-                        states.add(next)
-                        que.append(next)  # Append the next state to the queue
+        return True
 
-                    if hasattr(symbol, 'productions'):
-                        self.setgoto(curr, symbol, next)  # For terminals,
-                    else:
-                        self.setaction(curr, symbol, self.shift, next)  # For non-terminals,
+    def compact(self, op, kernels, reductions, transitions):
+        """
+        Drop the states left unreachable by merging and renumber the others in breadth first order.
 
-        return start
+        :param op: the Operation object interning the items
+        :param kernels:
+        :param reductions:
+        :param transitions:
+        :return:
+        """
+
+        order = [0]
+        index = {0: 0}
+
+        for curr in order:
+            for next in transitions[curr].values():
+                if next not in index:
+                    index[next] = len(order)
+                    order.append(next)
+
+        self.states = [LR0.ItemSet(op.item(*k, la) for k, la in kernels[i].items()) for i in order]
+        self.reductions = [reductions[i] for i in order]
+        self.transitions = [{sym: index[next] for sym, next in transitions[i].items()} for i in order]
+
+    def __len__(self):
+        return self.states.__len__()
+
+
+class MinimalParser(Parser):
+    """
+    Minimal LR(1) parser, see MinimalAutomaton.
+    """
+
+    def construct(self, aug_gram):
+
+        self.op = Operation(aug_gram)
+        start = self.op.item(aug_gram.START_PROD, 0, self.op.analysis.bits[aug_gram.END])
+
+        self.fill(aug_gram, MinimalAutomaton(self.op, start))
+
+        return 0
 
 
 @debug.log_attr(msg='MAIN', log_obj=True)
 def main():
+    import cache
+
     filename = './test-input/test-LR1-input_RE.txt'
-    g = LRParser.AugmentedGrammarBuilder(filename=filename).build()
-    parser = Parser(g)
+    g, parser = cache.load(filename, 'lr1')
 
     inputs = ['a(1a|2)+', '[ab]([ab]|[12])*', '[12ab]a+(a|b)']
     passed = 0
@@ -1,7 +1,10 @@
 import debug
 import grammar
 
+import heapq
+from array import array
 from collections import deque
+from itertools import chain, repeat
 
 
 class AugmentedGrammarBuilder(grammar.GrammarBuilder):
@@ -31,64 +34,712 @@ class ParseFinish(BaseParseException):
     pass
 
 
-class LRParser(object):
+# Encoding of the entries in an ACTION row:
+#   0       error
+#   n > 0   shift and go to state n - 1
+#   n < 0   reduce by production -n - 1
+# Production 0 is always the START production, so reducing by it means ACCEPT.
+ERROR = 0
+ACCEPT = -1
+
+# Entry of a GOTO row without any transition
+NO_GOTO = -1
+
+# The terminal id of a symbol not in the grammar
+UNKNOWN = -1
+
+
+def ids(tid, symbols):
+    """
+
+    :param tid: a dict mapping terminals to their ids
+    :param symbols: an iterable of terminals
+    :return: an iterator of terminal ids, UNKNOWN for the symbols not in tid
+    """
+
+    return map(tid.get, symbols, repeat(UNKNOWN))
+
+
+def shift_code(state):
+    return state + 1
+
+
+def reduce_code(prodno):
+    return -prodno - 1
+
+
+class ParseResult(object):
+    """
+    Returned by LRParser.parse instead of raising.
+    It unpacks like a parse exception: msg, errno = parser.parse(symbols)
+    """
+
+    def __init__(self, msg, errno, pos, value=None):
+        self.msg = msg
+        self.errno = errno
+        self.pos = pos  # Index of the symbol where the parse stopped
+        self.value = value  # Value of the start symbol, see LRParser.evaluate
+
+    def __iter__(self):
+        return iter((self.msg, self.errno))
+
+    def __repr__(self):
+        return '%s(%r, %d, %d)' % (self.__class__.__name__, self.msg, self.errno, self.pos)
+
+
+class Conflict(object):
+    """
+    A state and a terminal with more than one action, collected by LRParser.fill.
+
+    self.shift is the state shifted to or None, self.reductions the productions reduced by,
+    self.items the items of the state involved and self.example a shortest input reaching the
+    state, whose next symbol is self.symbol.
+    """
+
+    def __init__(self, state, symbol, shift, reductions, items, example):
+        self.state = state
+        self.symbol = symbol
+        self.shift = shift
+        self.reductions = reductions
+        self.items = items
+        self.example = example
+
+    @property
+    def kind(self):
+        return 'reduce/reduce' if self.shift is None else 'shift/reduce'
+
+    def __str__(self):
+        actions = ['shift to %d' % self.shift] if self.shift is not None else []
+        actions.extend('reduce by %s' % prod for prod in self.reductions)
+
+        return '\n'.join(
+            ['State %d, %s conflict on %s: %s, %s kept' % (self.state, self.kind, self.symbol, ' | '.join(actions),
+                                                            actions[0])] +
+            ['    %s' % item for item in self.items] +
+            ['    input: %s, next: %s' % (' '.join(map(str, self.example)), self.symbol)]
+        )
+
+
+def readonly(row):
+    """
+    Return a read-only view of a row of ints. Arrays are copied first so that later changes
+    to them, e.g. by LRParser.eliminate_units, are not seen through the view.
+
+    :param row: an array or a memoryview of ints
+    :return: a memoryview
+    """
+
+    if isinstance(row, memoryview) and row.readonly:
+        return row  # Mapped from a table file
+    return memoryview(array('i', row)).toreadonly()
+
+
+class Tables(object):
+    """
+    The tables of a parser, shared by any number of concurrent parses.
+
+    Nothing is changed after creation: the rows are read-only memoryviews and the other sequences
+    are tuples, while every parse keeps its state in local variables or in its own Session.
+    So one Tables object serves many threads or asyncio tasks at once:
+
+    >>> tables = parser.freeze()
+    >>> session = tables.session()
+    """
+
+    def __init__(self, parser):
+        self.terminals = tuple(parser.terminals)
+        self.nterminals = tuple(parser.nterminals)
+        self.productions = tuple(parser.productions)
+        self.tid = dict(parser.tid)
+        self.end = parser.end
+        self.lhs = readonly(parser.lhs)
+        self.rhslen = readonly(parser.rhslen)
+        self.semantics = tuple(parser.semantics)
+        self.action = tuple(readonly(row) for row in parser.action)
+        self.goto = tuple(readonly(row) for row in parser.goto)
+        self.nonassoc = frozenset(parser.nonassoc)
+        self.startset = parser.startset
+
+    def parse(self, symbols):
+        """
+        Should be fed a symbols sequence terminated with an endmarker.
+
+        :param symbols: an iterable objcect teminated with an endmarker
+        :return: a ParseResult object, errno is 0 for success
+        """
+
+        return self.drive(ids(self.tid, symbols))
+
+    def drive(self, tokens):
+        """
+        The shift/reduce loop over terminal ids. Nothing is printed and nothing is raised:
+        an UNKNOWN id or a missing GOTO entry ends the parse with an error like any other.
+
+        :param tokens: an iterable of terminal ids teminated with the id of the endmarker
+        :return: a ParseResult object, errno is 0 for success
+        """
+
+        action = self.action
+        goto = self.goto
+        lhs = self.lhs
+        rhslen = self.rhslen
+
+        state = self.startset
+        stack = [state]
+        pos = 0
+
+        for t in tokens:
+            if t < 0:
+                return ParseResult('Unknown symbol.', -1, pos)
+            while True:
+                code = action[state][t]
+
+                if code > 0:  # SHIFT
+                    state = code - 1
+                    stack.append(state)
+                    break
+                elif code < ACCEPT:  # REDUCE
+                    prodno = -code - 1
+                    n = rhslen[prodno]
+                    if n:
+                        del stack[-n:]
+                    state = goto[stack[-1]][lhs[prodno]]
+                    if state == NO_GOTO:
+                        return ParseResult('No such transition.', -1, pos)
+                    stack.append(state)
+                elif code == ACCEPT:
+                    return ParseResult('Accepted.', 0, pos)
+                else:
+                    return ParseResult('No such action.', -1, pos)
+            pos += 1
+
+        return ParseResult('Unexpected end of input.', -1, pos)
+
+    def session(self, semantic=False):
+        """
+        Start a push mode parse, see Session.
+
+        :param semantic: keep a value stack and run the semantic actions like self.evaluate
+        :return: a Session object
+        """
+
+        return Session(self, semantic)
+
+    def evaluate(self, symbols, values=None):
+        """
+        The loop of self.drive with a value stack in parallel with the state stack.
+        Only the values of the popped symbols are copied on a reduction, for the call of its action.
+
+        :param symbols: an iterable objcect teminated with an endmarker
+        :param values: the value of every symbol, the symbols themselves by default
+        :return: a ParseResult object whose value is that of the start symbol
+        """
+
+        action = self.action
+        goto = self.goto
+        lhs = self.lhs
+        rhslen = self.rhslen
+        semantics = self.semantics
+
+        tid = self.tid
+        if values is None:
+            pairs = ((tid.get(sym, UNKNOWN), sym) for sym in symbols)
+        else:
+            pairs = zip(ids(tid, symbols), values)
+
+        state = self.startset
+        stack = [state]
+        vstack = []
+        pos = 0
+
+        for t, value in pairs:
+            if t < 0:
+                return ParseResult('Unknown symbol.', -1, pos)
+            while True:
+                code = action[state][t]
+
+                if code > 0:  # SHIFT
+                    state = code - 1
+                    stack.append(state)
+                    vstack.append(value)
+                    break
+                elif code < ACCEPT:  # REDUCE
+                    prodno = -code - 1
+                    n = rhslen[prodno]
+                    func = semantics[prodno]
+                    if n:
+                        args = vstack[-n:]
+                        del stack[-n:]
+                        del vstack[-n:]
+                        vstack.append(func(*args) if func else args[0])
+                    else:
+                        vstack.append(func() if func else None)
+                    state = goto[stack[-1]][lhs[prodno]]
+                    if state == NO_GOTO:
+                        return ParseResult('No such transition.', -1, pos)
+                    stack.append(state)
+                elif code == ACCEPT:  # Only the body of the START production is left
+                    func = semantics[0]
+                    result = func(*vstack) if func else (vstack[0] if vstack else None)
+                    return ParseResult('Accepted.', 0, pos, result)
+                else:
+                    return ParseResult('No such action.', -1, pos)
+            pos += 1
+
+        return ParseResult('Unexpected end of input.', -1, pos)
+
+
+class LRParser(Tables):
     """
     Apply to an augmented grammar which has only one production starts with the START symbol
+
+    States, terminals, non-terminals and productions are all numbered with integers.
+    self.action[state][terminal] and self.goto[state][nterminal] are rows of array('i')
+    so that the parse loop never hashes an item set or a symbol.
+
+    The tables of a parser may still be changed by self.semantic or self.eliminate_units.
+    Once they are set up, self.freeze returns an immutable copy to share between parses.
+
+    Construction always runs to the end and collects every conflict in self.conflicts, see Conflict.
+    A shift is kept over a reduction and the production coming first in the grammar file over
+    later ones, like in yacc, since productions are numbered in that order, see GrammarBuilder.build.
+    Unless strict is False, a ParseError reporting all of them is then raised.
     """
 
-    def __init__(self, aug_gram):
-        self.goto = {}
-        self.action = {}
+    def __init__(self, aug_gram, strict=True):
+        self.number(aug_gram)
+
+        self.goto = []
+        self.action = []
+        self.states = []
+        self.nonassoc = set()  # (state, terminal id) made errors by %nonassoc, see self.resolve
+        self.resolved = []  # Shift/reduce conflicts resolved by precedence, see self.resolve
+        self.clashes = {}  # Map (state, terminal id) to all of its actions, see self.conflicts
+        self.conflicts = []
         self.startset = self.construct(aug_gram)
 
-    def setaction(self, state, sym, func, *args):
+        if strict and self.conflicts:
+            raise ParseError('%d conflicts found:\n%s' % (len(self.conflicts), self.report()), -1)
+
+    def number(self, aug_gram):
         """
-        Set action on (state, sym). If conflict found, an error will be raised.
+        Assign integer ids to terminals, non-terminals and productions.
 
-        :param state:
-        :param sym:
-        :param func:
-        :param args:
+        :param aug_gram:
         :return:
         """
 
-        k = (state, sym)
-        v = (func, args)
+        self.terminals = list(aug_gram.terminals())
+        self.nterminals = list(aug_gram.nterminals())
+        self.productions = aug_gram.productions()
+        self.pid = aug_gram.production_ids()
+        assert self.productions[0] == aug_gram.START_PROD  # The START symbol comes first, see GrammarBuilder.build
 
-        found = self.action.get(k, None)
+        self.tid = {sym: i for i, sym in enumerate(self.terminals)}
+        self.ntid = {sym: i for i, sym in enumerate(self.nterminals)}
+        self.end = self.tid[aug_gram.END]
 
-        if found and found != v:
-            raise ParseError('Conflict found', -1)
+        # For every production: the id of its head and the length of its body
+        self.lhs = array('i', [self.ntid[p.head] for p in self.productions])
+        self.rhslen = array('i', [len(p) for p in self.productions])
+
+        # The semantic action of every production, see self.semantic
+        self.semantics = [None] * len(self.productions)
+
+        # The (level, associativity) of every terminal and production, or None, see self.resolve
+        self.tokprec = [aug_gram.PRECEDENCE.get(str(sym)) for sym in self.terminals]
+        self.prodprec = [aug_gram.precedence(p) for p in self.productions]
+
+    @classmethod
+    def from_tables(cls, aug_gram, tables):
+        """
+        Create a parser from tables saved by self.tables, without constructing anything.
+
+        :param aug_gram: the grammar the tables were built from
+        :param tables: a dict returned by self.tables
+        :return: a parser
+        """
+
+        parser = cls.__new__(cls)
+        parser.number(aug_gram)
+
+        if tables['symbols'] != parser.symbols():
+            raise ValueError('The tables are built from another grammar.')
+
+        parser.action = tables['action']
+        parser.goto = tables['goto']
+        parser.states = []  # Item sets are not saved
+        parser.conflicts = []
+        parser.nonassoc = set(tables['nonassoc'])
+        parser.startset = tables['startset']
+
+        return parser
+
+    def symbols(self):
+        """
+
+        :return: the names of the terminals, the non-terminals and the productions in the order of their ids
+        """
+
+        return ([str(sym) for sym in self.terminals],
+                [str(sym) for sym in self.nterminals],
+                [str(prod) for prod in self.productions])
+
+    def tables(self):
+        """
+        Return everything needed by self.parse as plain data, see self.from_tables.
+
+        :return: a dict
+        """
+
+        return {
+            'symbols': self.symbols(),
+            'action': self.action,
+            'goto': self.goto,
+            'startset': self.startset,
+            'nonassoc': sorted(self.nonassoc),
+        }
+
+    def semantic(self, prod, func):
+        """
+        Register the semantic action of a production. On reducing by prod, self.evaluate calls
+        func with the values of the body symbols and pushes its result as the value of the head.
+        Without an action the value of the head is that of the first body symbol, or None.
+
+        :param prod: a Production object of the grammar
+        :param func: a callable, or None to remove the action
+        :return:
+        """
+
+        self.semantics[self.pid[prod]] = func
+
+    def bind(self, namespace):
+        """
+        Register the actions named in the grammar file, e.g. E : E + T {add} ;
+
+        :param namespace: a dict or an object such as a module, holding a callable for every name
+        :return: the productions with an action, which may be given to self.eliminate_units as keep
+        """
+
+        lookup = namespace.__getitem__ if isinstance(namespace, dict) else lambda name: getattr(namespace, name)
+
+        bound = []
+        for prod in self.productions:
+            if prod.action is not None:
+                self.semantic(prod, lookup(prod.action))
+                bound.append(prod)
+
+        return bound
+
+    def freeze(self):
+        """
+        Copy the tables into an immutable Tables object, see Tables.
+
+        :return: a Tables object
+        """
+
+        return Tables(self)
+
+    def newstate(self, itemset):
+        """
+        Number a new state and allocate its ACTION and GOTO rows.
+
+        :param itemset:
+        :return: the id of the state
+        """
+
+        self.states.append(itemset)
+        self.action.append(array('i', [ERROR]) * len(self.terminals))
+        self.goto.append(array('i', [NO_GOTO]) * len(self.nterminals))
 
-        self.action[k] = v
+        return len(self.states) - 1
+
+    def setaction(self, state, sym, code):
+        """
+        Set action on (state, sym). A shift/reduce conflict is resolved by precedence if possible,
+        otherwise it is recorded in self.clashes.
+
+        :param state: id of the state
+        :param sym: a terminal
+        :param code: the encoded action
+        :return:
+        """
+
+        row = self.action[state]
+        k = self.tid[sym]
+
+        if (state, k) in self.nonassoc:
+            return
+
+        found = row[k]
+
+        if found != ERROR and found != code:
+            resolved = self.resolve(state, k, found, code)
+
+            if resolved is None:
+                self.clashes.setdefault((state, k), {found}).add(code)
+                resolved = max(found, code)  # Shift first, then the lowest production id
+
+            code = resolved
+
+        row[k] = code
+
+    def resolve(self, state, k, found, code):
+        """
+        Resolve a shift/reduce conflict like yacc: the reduction wins if its production binds
+        tighter than the terminal, the shift wins if the terminal binds tighter. At the same level,
+        %left reduces, %right shifts and %nonassoc makes the pair an error.
+
+        :param state: id of the state
+        :param k: id of the terminal
+        :param found: the action already set
+        :param code: the action to set
+        :return: the action to keep, or None if there is no precedence to decide
+        """
+
+        shift, reduce = (found, code) if found > 0 else (code, found)
+
+        if shift <= 0 or reduce >= ACCEPT or (state, k) in self.clashes:  # Not shift/reduce
+            return None
+
+        tok = self.tokprec[k]
+        prod = self.prodprec[-reduce - 1]
+
+        if tok is None or prod is None:
+            return None
+
+        if prod[0] != tok[0]:
+            keep = reduce if prod[0] > tok[0] else shift
+        elif tok[1] == 'left':
+            keep = reduce
+        elif tok[1] == 'right':
+            keep = shift
+        else:
+            keep = ERROR
+            self.nonassoc.add((state, k))
+
+        self.resolved.append((state, k, shift, reduce, keep))
+
+        return keep
+
+    def setshift(self, state, sym, next):
+        self.setaction(state, sym, shift_code(next))
+
+    def setreduce(self, state, sym, prod):
+        self.setaction(state, sym, reduce_code(self.pid[prod]))
+
+    def setaccept(self, state, sym):
+        self.setaction(state, sym, ACCEPT)
 
     def setgoto(self, state, sym, next):
         """
         Set action on (state, sym). If conflict found, an error will be raised.
 
-        :param state:
-        :param sym:
-        :param next:
+        :param state: id of the state
+        :param sym: a non-terminal
+        :param next: id of the next state
         :return:
         """
-        k = (state, sym)
 
-        found = self.goto.get(k, None)
+        row = self.goto[state]
+        k = self.ntid[sym]
+
+        found = row[k]
 
-        if found and found != next:
+        if found != NO_GOTO and found != next:
             raise ParseError('Conflict found', -1)
 
-        self.goto[k] = next
+        row[k] = next
+
+    def fill(self, aug_gram, automaton):
+        """
+        Fill the ACTION and GOTO rows from an automaton whose states are item sets.
+        Complete items are taken from automaton.reductions.
+
+        :param aug_gram:
+        :param automaton: an object with states and transitions, see LR0.Automaton
+        :return:
+        """
+
+        for state in automaton.states:
+            self.newstate(state)
+
+        for index, trans in enumerate(automaton.transitions):
+
+            for symbol, next in trans.items():
+                if hasattr(symbol, 'productions'):
+                    self.setgoto(index, symbol, next)  # For non-terminals,
+                else:
+                    self.setshift(index, symbol, next)  # For terminals,
+
+            for item in automaton.reductions[index]:
+
+                # The item that leads to accepted state may be grouped together with other items.
+                # That means a combination such as {S->E@#, E->E@+T, E->E@-T} is also possible.
+
+                if item.prod == aug_gram.START_PROD:  # For the accepted state
+                    self.setaccept(index, aug_gram.END)
+                else:
+                    for symbol in self.lookahead(index, item):
+                        self.setreduce(index, symbol, item.prod)
+
+        self.conflicts.extend(self.explain(automaton))
+
+    def explain(self, automaton):
+        """
+        Turn self.clashes into Conflict objects.
+
+        :param automaton: the automaton the tables are filled from
+        :return: a list of Conflict objects ordered by state and terminal
+        """
+
+        import LR0
+
+        if not self.clashes:
+            return []
+
+        prefixes = self.prefixes(automaton)
+        conflicts = []
+
+        for (state, k), codes in sorted(self.clashes.items()):
+            sym = self.terminals[k]
+            shift = next((code - 1 for code in codes if code > 0), None)
+            reductions = [self.productions[-code - 1] for code in sorted(codes, reverse=True) if code < 0]
+
+            items = []
+            if shift is not None:  # The items of the next state, with the dot moved back before sym
+                items.extend(str(LR0.Item(item.prod, item.pos - 1)) for item in automaton.states[shift]
+                             if item.pos and item.prod.body[item.pos - 1] == sym)
+            items.extend(str(LR0.Item(item.prod, item.pos)) for item in automaton.reductions[state]
+                         if item.prod in reductions)
+
+            conflicts.append(Conflict(state, sym, shift, reductions, sorted(set(items)), prefixes[state]))
+
+        return conflicts
+
+    def prefixes(self, automaton):
+        """
+        Find a shortest input reaching every state, by Dijkstra over the transitions where
+        a non-terminal weighs as much as the shortest string of terminals it derives.
+
+        :param automaton:
+        :return: a list of tuples of terminals
+        """
+
+        yields = {}  # Map a non-terminal to a shortest string of terminals it derives
+        changed = True
+        while changed:
+            changed = False
+            for prod in self.productions:
+                if all(sym in yields or sym in self.tid for sym in prod.body):
+                    y = tuple(chain.from_iterable(yields.get(sym, (sym,)) for sym in prod.body))
+                    if prod.head not in yields or len(y) < len(yields[prod.head]):
+                        yields[prod.head] = y
+                        changed = True
+
+        prefixes = [None] * len(automaton.transitions)
+        prefixes[0] = ()
+        heap = [(0, 0)]
+
+        while heap:
+            n, state = heapq.heappop(heap)
+            if n > len(prefixes[state]):
+                continue
+
+            for sym, next in automaton.transitions[state].items():
+                prefix = prefixes[state] + yields.get(sym, (sym,))
+                if prefixes[next] is None or len(prefix) < len(prefixes[next]):
+                    prefixes[next] = prefix
+                    heapq.heappush(heap, (len(prefix), next))
+
+        return prefixes
+
+    def report(self):
+        """
+
+        :return: the conflicts as readable text
+        """
+
+        return '\n'.join(map(str, self.conflicts))
+
+    def lookahead(self, state, item):
+        """
+        Return the terminals on which a complete item is reduced.
+
+        :param state: id of the state
+        :param item: a complete item of the state
+        :return: an iterable of terminals
+        """
+        raise NotImplementedError
 
     def construct(self, aug_gram):
         """
         Construct the LR analysis tables.
 
         :param aug_gram:
-        :return:
+        :return: id of the start state
         """
         raise NotImplementedError
 
+    def eliminate_units(self, keep=()):
+        """
+        Bypass the reductions by unit productions A->B.
+
+        A state t = goto(s, B) whose only action is the reduction by A->B pops itself and
+        goes to goto(s, A) on every terminal. So goto(s, B) is replaced by goto(s, A), resolved
+        transitively along chains such as F->i, T->F, E->T, and t is never entered.
+        Error detection may be delayed by some reductions, but no invalid symbol is ever shifted.
+
+        Productions with a semantic action, see self.semantic, are always reduced by.
+
+        :param keep: other productions whose reductions must still be performed
+        :return: the number of GOTO entries bypassed
+        """
+
+        keep = {self.pid[prod] for prod in keep}
+        keep.update(prodno for prodno, func in enumerate(self.semantics) if func is not None)
+
+        unit = {}  # Map a state to the unit production it always reduces by
+
+        # States with errors made by %nonassoc must be entered to detect them
+        nonassoc = {state for state, _ in self.nonassoc}
+
+        for state, (row, grow) in enumerate(zip(self.action, self.goto)):
+
+            codes = set(row)
+            codes.discard(ERROR)
+
+            if len(codes) != 1 or state in nonassoc or any(next != NO_GOTO for next in grow):
+                continue
+
+            code = codes.pop()
+            if code >= ACCEPT:  # A shift or the accepted state
+                continue
+
+            prodno = -code - 1
+            prod = self.productions[prodno]
+
+            if prodno not in keep and len(prod) == 1 and hasattr(prod[0], 'productions'):
+                unit[state] = prodno
+
+        # Rows mapped from a table file are read-only
+        self.goto = [row if isinstance(row, array) else array('i', row) for row in self.goto]
+
+        bypassed = 0
+
+        for row in self.goto:
+            for nt, next in enumerate(row):
+
+                target = next
+                while target in unit:
+                    target = row[self.lhs[unit[target]]]
+
+                if target != next:
+                    row[nt] = target
+                    bypassed += 1
+
+        return bypassed
+
     @debug.log_param(msg='ACCEPT')
     def accept(self):
         """
@@ -100,59 +751,207 @@ class LRParser(object):
         raise ParseFinish('Accepted.', 0)
 
     @debug.log_param(msg='SHIFT')
-    def shift(self, state):
+    def shift(self, stack, input, state):
         """
-        Shift a symbol from self.test-input and push the state onto self.stack
+        Shift a symbol from the input and push the state onto the stack
 
+        :param stack: the state stack of the parse
+        :param input: a deque of the remaining terminal ids
         :param state:
         :return:
         """
 
-        self.input.popleft()
-        self.stack.append(state)
+        input.popleft()
+        stack.append(state)
 
     @debug.log_param(names=['prod'], msg='REDUCE')
-    def reduce(self, prod):
+    def reduce(self, stack, prod):
         """
-        Reduce the prod.body on the top of self.stack to prod.head
+        Reduce the prod.body on the top of the stack to prod.head
 
+        :param stack: the state stack of the parse
         :param prod: a Production object used in the reduction
         :return:
         """
 
-        stack = self.stack[:-len(prod)]     # Pop states and symbols from the stack
+        if len(prod):
+            del stack[-len(prod):]     # Pop states and symbols from the stack
         curr = stack[-1]
 
-        try:
-            next = self.goto[(curr, prod.head)]
-        except KeyError:
+        next = self.goto[curr][self.ntid[prod.head]]
+        if next == NO_GOTO:
             raise ParseError('No such transition.', -1)
 
         stack.append(next)
-        self.stack = stack      # Remember to assign self.stack stack
 
     @debug.log_param(msg='PARSE BEGIN')
-    def parse(self, symbols):
+    def trace(self, symbols):
         """
-        Should be fed a symbols sequence terminated with an endmarker.
+        The debug version of self.parse: every action is dispatched through a logged method.
+        The input and the stack are passed along, so concurrent traces do not interfere.
 
         :param symbols: an iterable objcect teminated with an endmarker
-        :return: a string msg and an int number, 0 for success
+        :return: a ParseResult object
         """
-        self.input = deque(symbols)
-        self.stack = [self.startset]
+        input = deque(ids(self.tid, symbols))
+        stack = [self.startset]
+        total = len(input)
 
         while True:
             try:
-                curr = self.stack[-1]
-                sym = self.input[0]
+                if input[0] == UNKNOWN:
+                    raise ParseError('Unknown symbol.', -1)
+                code = self.action[stack[-1]][input[0]]
+
+                if code > 0:
+                    self.shift(stack, input, code - 1)
+                elif code == ACCEPT:
+                    self.accept()
+                elif code < 0:
+                    self.reduce(stack, self.productions[-code - 1])
+                else:
+                    raise ParseError('No such action.', -1)
+            except IndexError:
+                return ParseResult('Unexpected end of input.', -1, total)
+            except (ParseError, ParseFinish) as e:
+                return ParseResult(e.msg, e.errno, total - len(input))
 
-                action = self.action[(curr, sym)]
+    def parse(self, symbols, trace=False):
+        """
+        Should be fed a symbols sequence terminated with an endmarker.
 
-                method = action[0]
-                method(*action[1])
-            except KeyError as e:
-                raise ParseError('No such action.', -1)
-            except (ParseError, ParseFinish) as e:
-                return e
+        :param symbols: an iterable objcect teminated with an endmarker
+        :param trace: log every action through self.trace instead
+        :return: a ParseResult object, errno is 0 for success
+        """
+
+        if trace:
+            return self.trace(symbols)
+
+        return Tables.parse(self, symbols)
+
+
+class Session(object):
+    """
+    A parse fed incrementally, e.g. from a generator or a socket:
+
+    >>> session = parser.session()
+    >>> for line in lines:
+    ...     session.feed(g.T[c] for c in line)
+    >>> msg, errno = session.finish()
+
+    Only the parse stack is kept, so the memory used does not grow with the input
+    and parsing overlaps with reading it. The endmarker is pushed by finish.
+    """
+
+    def __init__(self, tables, semantic=False):
+        self.tables = tables  # An LRParser or a Tables object, only read
+        self.state = tables.startset
+        self.stack = [self.state]
+        self.vstack = [] if semantic else None
+        self.pos = 0
+        self.result = None  # Set when the parse is accepted or an error is found
+
+    def feed(self, symbols, values=None):
+        """
+
+        :param symbols: an iterable of terminals, which may contain the endmarker
+        :param values: the value of every symbol, the symbols themselves by default
+        :return: the ParseResult if the parse has stopped, or None if more input is expected
+        """
+
+        if values is None and self.vstack is not None:
+            values = symbols = tuple(symbols)  # Iterated twice
+
+        return self.push(ids(self.tables.tid, symbols), values)
+
+    def push(self, tokens, values=None):
+        """
+        The loop of LRParser.drive and LRParser.evaluate, resumable after any token.
+        Symbols fed after the parse has stopped are ignored.
+
+        :param tokens: an iterable of terminal ids
+        :param values: the value of every token, required if the session is semantic
+        :return: the ParseResult if the parse has stopped, or None if more input is expected
+        """
+
+        if self.result is not None:
+            return self.result
+
+        tables = self.tables
+        action = tables.action
+        goto = tables.goto
+        lhs = tables.lhs
+        rhslen = tables.rhslen
+        semantics = tables.semantics
+
+        state = self.state
+        stack = self.stack
+        vstack = self.vstack
+        pos = self.pos
+
+        if vstack is not None:
+            values = iter(values)
+
+        for t in tokens:
+            if t < 0:
+                self.result = ParseResult('Unknown symbol.', -1, pos)
+                break
+            while True:
+                code = action[state][t]
+
+                if code > 0:  # SHIFT
+                    state = code - 1
+                    stack.append(state)
+                    if vstack is not None:
+                        vstack.append(next(values))
+                    break
+                elif code < ACCEPT:  # REDUCE
+                    prodno = -code - 1
+                    n = rhslen[prodno]
+                    if n:
+                        del stack[-n:]
+                    if vstack is not None:
+                        func = semantics[prodno]
+                        if n:
+                            args = vstack[-n:]
+                            del vstack[-n:]
+                            vstack.append(func(*args) if func else args[0])
+                        else:
+                            vstack.append(func() if func else None)
+                    state = goto[stack[-1]][lhs[prodno]]
+                    if state == NO_GOTO:
+                        self.result = ParseResult('No such transition.', -1, pos)
+                        break
+                    stack.append(state)
+                elif code == ACCEPT:
+                    value = None
+                    if vstack is not None:
+                        func = semantics[0]
+                        value = func(*vstack) if func else (vstack[0] if vstack else None)
+                    self.result = ParseResult('Accepted.', 0, pos, value)
+                    break
+                else:
+                    self.result = ParseResult('No such action.', -1, pos)
+                    break
+
+            if self.result is not None:
+                break
+            pos += 1
+
+        self.state = state
+        self.pos = pos
+
+        return self.result
+
+    def finish(self):
+        """
+        Push the endmarker unless it has been fed.
+
+        :return: the ParseResult
+        """
+
+        if self.result is None:
+            self.push((self.tables.end,), (None,))
 
+        return self.result
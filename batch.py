@@ -0,0 +1,151 @@
+"""
+Parse a large corpus of lines across a process pool.
+
+    python batch.py GRAMMAR INPUT [MODE] [WORKERS]
+
+The tables are built, or found in the cache, once in the calling process. Every worker then
+loads them once in the initializer of the pool by mapping the cached file, or receives them
+through the arguments of the initializer if the cache cannot be written, so tasks carry only
+lines and results. At most a fixed number of chunks are in flight, so memory stays
+bounded whatever the size of the input, and results come back in input order.
+"""
+
+import contextlib
+import io
+import itertools
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import cache
+import debug
+import LRParser
+
+# Set in every worker by init
+_grammar = None
+_tables = None
+
+
+def init(filename, mode, directory, tables=None):
+    """
+    Load the tables in a worker.
+
+    :param filename: the grammar file
+    :param mode: a key of cache.MODES
+    :param directory: the cache directory
+    :param tables: the dict of LRParser.tables if they are not in the cache
+    :return:
+    """
+
+    global _grammar, _tables
+
+    with contextlib.redirect_stdout(io.StringIO()):  # Building a grammar is logged
+        if tables is None:
+            _grammar, parser = cache.load(filename, mode, directory)
+        else:
+            _grammar = LRParser.AugmentedGrammarBuilder(filename=filename).build()
+            parser = cache.MODES[mode].from_tables(_grammar, tables)
+
+    _tables = parser.freeze()
+
+
+def parse_line(line):
+    """
+    Parse a line whose characters are terminals, in a worker.
+
+    :param line:
+    :return: a ParseResult object
+    """
+
+    T = _grammar.T
+    session = _tables.session()
+    session.feed(T.get(c) for c in line)  # Characters not in the grammar end the parse
+
+    return session.finish()
+
+
+def parse_chunk(lines):
+    return [parse_line(line) for line in lines]
+
+
+def chunks(lines, size):
+    """
+
+    :param lines: an iterable
+    :param size: the number of lines in a chunk
+    :return: an iterator of lists of lines
+    """
+
+    lines = iter(lines)
+    return iter(lambda: list(itertools.islice(lines, size)), [])
+
+
+def parse_lines(filename, lines, mode='lr1', workers=None, chunksize=1000, directory=None):
+    """
+    Parse every line across a pool of processes.
+
+    :param filename: the grammar file
+    :param lines: an iterable of strings, consumed lazily
+    :param mode: a key of cache.MODES
+    :param workers: the number of processes, the number of cores by default
+    :param chunksize: the number of lines sent to a worker at once
+    :param directory: the cache directory, cache.DIRECTORY by default
+    :return: an iterator of ParseResult objects in the order of the lines
+    """
+
+    workers = workers or os.cpu_count() or 1
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, parser, cached = cache.fetch(filename, mode, directory)  # Build the tables once, before the workers start
+
+    tables = None if cached else parser.tables()  # Sent once to every worker instead
+
+    with ProcessPoolExecutor(workers, initializer=init, initargs=(filename, mode, directory, tables)) as executor:
+        pending = deque()
+
+        for chunk in chunks(lines, chunksize):
+            if len(pending) >= 2 * workers:  # Bound the chunks in flight
+                yield from pending.popleft().result()
+            pending.append(executor.submit(parse_chunk, chunk))
+
+        while pending:
+            yield from pending.popleft().result()
+
+
+def parse_file(filename, input, mode='lr1', workers=None, chunksize=1000, directory=None):
+    """
+    Parse every line of a file, see parse_lines.
+
+    :param filename: the grammar file
+    :param input: the file of lines to parse
+    :return: the number of lines passed and the number of lines failed
+    """
+
+    passed = failed = 0
+
+    with open(input) as f:
+        lines = (line.rstrip('\n') for line in f)
+
+        for result in parse_lines(filename, lines, mode, workers, chunksize, directory):
+            if result.errno == 0:
+                passed += 1
+            else:
+                failed += 1
+
+    return passed, failed
+
+
+@debug.log_attr(msg='MAIN', log_obj=True)
+def main():
+    filename, input = sys.argv[1:3]
+    mode = sys.argv[3] if len(sys.argv) > 3 else 'lr1'
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else None
+
+    passed, failed = parse_file(filename, input, mode, workers)
+
+    return 'Passed %d test, failed %d.' % (passed, failed)
+
+
+if __name__ == '__main__':
+    main()
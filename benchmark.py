@@ -0,0 +1,129 @@
+"""
+Benchmark of the construction of the automata.
+
+    python benchmark.py [repeat]
+
+Every grammar is built with the single pass goto partitioning of LR0.Automaton and with
+one goto per symbol, which scans the whole item set once for each symbol after a dot.
+"""
+
+import contextlib
+import io
+import sys
+import time
+
+import debug
+import LRParser
+import LR0
+import LR1
+
+
+class GotoAutomaton(LR0.Automaton):
+    """
+    The automaton built with one op.goto call for each distinct symbol of a state.
+    """
+
+    def successors(self, op, closure):
+        result = {}
+
+        for item in closure:
+            sym = item.expect()
+            if sym and sym not in result:
+                result[sym] = op.goto(closure, sym)
+
+        return result
+
+
+def expression_grammar(levels):
+    """
+    An expression grammar with a left associative binary operator on each level.
+
+    :param levels:
+    :return: a list of lines in the grammar file format
+    """
+
+    lines = ['S : E0', ';']
+    for i in range(levels):
+        lines += ['E%d : E%d o%d E%d | E%d' % (i, i, i, i + 1, i + 1), ';']
+    lines += ['E%d : ( E0 ) | i' % levels, ';']
+
+    return lines
+
+
+def statement_grammar(kinds, levels):
+    """
+    A list of statements, each starting with its own keyword, over an expression grammar.
+    The start state of a statement has many items and many distinct symbols after the dot.
+
+    :param kinds:
+    :param levels:
+    :return: a list of lines in the grammar file format
+    """
+
+    lines = ['S : L', ';', 'L : L T | T', ';']
+    lines += ['T : ' + ' | '.join('k%d E0 end' % i for i in range(kinds)), ';']
+    for i in range(levels):
+        lines += ['E%d : E%d o%d E%d | E%d' % (i, i, i, i + 1, i + 1), ';']
+    lines += ['E%d : ( E0 ) | i | ' % levels + ' | '.join('f%d ( E0 )' % i for i in range(kinds)), ';']
+
+    return lines
+
+
+def measure(build, repeat):
+    """
+
+    :param build: a function without arguments
+    :param repeat:
+    :return: the best time of the runs in seconds and the result of the last run
+    """
+
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = build()
+        best = min(best, time.perf_counter() - start)
+
+    return best, result
+
+
+@debug.log_attr(msg='BENCHMARK')
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+    with open('grammar2.txt') as f:
+        regex = f.read().splitlines()
+
+    grammars = [
+        ('grammar2.txt', regex),
+        ('expression(20)', expression_grammar(20)),
+        ('statement(40, 5)', statement_grammar(40, 5)),
+        ('statement(120, 10)', statement_grammar(120, 10)),
+    ]
+
+    print('%-20s %-6s %8s %12s %12s %8s' % ('grammar', 'mode', 'states', 'partition', 'goto', 'speedup'))
+
+    for name, lines in grammars:
+
+        with contextlib.redirect_stdout(io.StringIO()):  # Building a grammar is logged
+            g = LRParser.AugmentedGrammarBuilder(*lines).build()
+
+        modes = [
+            ('LR0', lambda: LR0.Operation(), LR0.Item(g.START_PROD, 0)),
+            ('LR1', lambda: LR1.Operation(g), None),
+        ]
+
+        for mode, make_op, start in modes:
+
+            def build(automaton_class):
+                op = make_op()
+                item = start or LR1.Item(g.START_PROD, 0, op.analysis.bits[g.END])
+                return automaton_class(op, item)
+
+            fast, automaton = measure(lambda: build(LR0.Automaton), repeat)
+            slow, _ = measure(lambda: build(GotoAutomaton), repeat)
+
+            print('%-20s %-6s %8d %11.4fs %11.4fs %7.2fx' % (name, mode, len(automaton), fast, slow, slow / fast))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+On-disk cache of parse tables.
+
+Tables are saved under a key made of the grammar text and the construction mode,
+so a later run loads them instead of constructing the automaton again.
+The files are in the format of tablefile and mapped in place, so worker processes
+loading the same grammar share one copy of the tables:
+
+>>> g, parser = cache.load('grammar2.txt', mode='lalr1')
+"""
+
+import hashlib
+import os
+import struct
+
+import LRParser
+import LR0
+import LR1
+import LALR1
+import tablefile
+
+# Construction modes
+MODES = {
+    'lr0': LR0.Parser,
+    'slr1': LR0.SLRParser,
+    'lalr1': LALR1.Parser,
+    'lr1': LR1.Parser,
+    'minimal-lr1': LR1.MinimalParser,
+}
+
+# Change it whenever the format of the tables changes
+VERSION = 3
+
+DIRECTORY = os.environ.get('CL_TABLE_CACHE', '.tables')
+
+
+def digest(builder, mode):
+    """
+    Compute the cache key of a grammar.
+
+    :param builder: a GrammarBuilder, whose raw lines are the text of the grammar
+    :param mode: a key of MODES
+    :return: a hex string
+    """
+
+    h = hashlib.sha256()
+    for part in (str(VERSION), mode, builder.raw_start, builder.raw_endmarker):
+        h.update(part.encode())
+        h.update(b'\0')
+    h.update('\n'.join(builder.raw_lines).encode())
+
+    return h.hexdigest()
+
+
+def path(builder, mode, directory=None):
+    return os.path.join(directory or DIRECTORY, '%s-%s.tables' % (mode, digest(builder, mode)))
+
+
+def save(parser, filename):
+    """
+    Write the tables of a parser. The file is replaced atomically,
+    so concurrent runs never read a partial file.
+
+    :param parser:
+    :param filename:
+    :return:
+    """
+
+    os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+
+    temp = '%s.%d' % (filename, os.getpid())
+    tablefile.dump(parser, temp)
+    os.replace(temp, filename)
+
+
+def load(filename, mode='lr1', directory=None, **kwargs):
+    """
+    Build the augmented grammar in a file and a parser of the given mode.
+    The tables are loaded from the cache if they have been built before.
+
+    :param filename: the grammar file
+    :param mode: a key of MODES
+    :param directory: the cache directory, DIRECTORY by default
+    :param kwargs: passed to LRParser.AugmentedGrammarBuilder
+    :return: the grammar and the parser
+    """
+
+    g, parser, _ = fetch(filename, mode, directory, **kwargs)
+    return g, parser
+
+
+def fetch(filename, mode='lr1', directory=None, **kwargs):
+    """
+    The same as load, telling whether the tables are in the cache afterwards.
+
+    :return: the grammar, the parser and False if the tables could not be saved
+    """
+
+    parser_class = MODES[mode]
+
+    builder = LRParser.AugmentedGrammarBuilder(filename=filename, **kwargs)
+    g = builder.build()
+
+    cached = path(builder, mode, directory)
+
+    try:
+        return g, parser_class.from_tables(g, tablefile.TableFile(cached)), True
+    except (OSError, ValueError, struct.error, UnicodeDecodeError):
+        pass  # Not cached yet or unreadable, build it again
+
+    parser = parser_class(g)
+    try:
+        save(parser, cached)
+    except OSError:
+        return g, parser, False  # A read-only cache only costs the construction
+
+    return g, parser, True
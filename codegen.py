@@ -0,0 +1,168 @@
+"""
+Generate a standalone parser module from a grammar file.
+
+    python codegen.py GRAMMAR MODE OUTPUT
+
+The generated module holds the tables as literals and a parse loop specialized for them.
+It imports nothing, so deploying it costs neither table construction nor any of the modules here.
+"""
+
+import sys
+
+import cache
+import debug
+
+TEMPLATE = '''"""
+LR parser generated by codegen.py from %(source)s with the %(mode)s construction. Do not edit.
+
+parse takes a sequence of terminal names terminated with the endmarker %(endmarker)r.
+"""
+
+TERMINALS = %(terminals)s
+
+NTERMINALS = %(nterminals)s
+
+PRODUCTIONS = %(productions)s
+
+# Map the name of a terminal to its id
+TERMINAL_IDS = {name: i for i, name in enumerate(TERMINALS)}
+
+# Id of the endmarker
+END = %(end)d
+
+# Head id and body length of every production
+LHS = %(lhs)s
+RHSLEN = %(rhslen)s
+
+# ACTION[state][terminal]: 0 error, n > 0 shift to n - 1, -1 accept, n < -1 reduce by production -n - 1
+ACTION = %(action)s
+
+# GOTO[state][nterminal]: the next state, -1 for none
+GOTO = %(goto)s
+
+START = %(start)d
+
+
+class ParseResult(object):
+
+    def __init__(self, msg, errno, pos):
+        self.msg = msg
+        self.errno = errno
+        self.pos = pos  # Index of the symbol where the parse stopped
+
+    def __iter__(self):
+        return iter((self.msg, self.errno))
+
+    def __repr__(self):
+        return '%%s(%%r, %%d, %%d)' %% (self.__class__.__name__, self.msg, self.errno, self.pos)
+
+
+def drive(tokens):
+    """
+    The shift/reduce loop.
+
+    :param tokens: an iterable of terminal ids teminated with END
+    :return: a ParseResult object, errno is 0 for success
+    """
+
+    action = ACTION
+    goto = GOTO
+    lhs = LHS
+    rhslen = RHSLEN
+
+    state = START
+    stack = [state]
+    pos = 0
+
+    for t in tokens:
+        if t < 0:
+            return ParseResult('Unknown symbol.', -1, pos)
+        while True:
+            code = action[state][t]
+
+            if code > 0:
+                state = code - 1
+                stack.append(state)
+                break
+            elif code < -1:
+                prodno = -code - 1
+                n = rhslen[prodno]
+                if n:
+                    del stack[-n:]
+                state = goto[stack[-1]][lhs[prodno]]
+                if state == -1:
+                    return ParseResult('No such transition.', -1, pos)
+                stack.append(state)
+            elif code == -1:
+                return ParseResult('Accepted.', 0, pos)
+            else:
+                return ParseResult('No such action.', -1, pos)
+        pos += 1
+
+    return ParseResult('Unexpected end of input.', -1, pos)
+
+
+def parse(names):
+    """
+
+    :param names: an iterable of terminal names teminated with the name of the endmarker
+    :return: a ParseResult object, errno is 0 for success and -1 for any error, names not in TERMINALS included
+    """
+
+    return drive(TERMINAL_IDS.get(name, -1) for name in names)
+'''
+
+
+def literal(rows):
+    """
+    Format a table as a tuple, one row per line. Rows other than strings become tuples.
+
+    :param rows:
+    :return:
+    """
+
+    return '(\n%s)' % ''.join('    %r,\n' % (row if isinstance(row, str) else tuple(row),) for row in rows)
+
+
+def generate(filename, mode='lalr1'):
+    """
+    Build the tables of a grammar file and return the source of a standalone parser module.
+
+    :param filename: a grammar file understood by GrammarBuilder
+    :param mode: a key of cache.MODES
+    :return: a string
+    """
+
+    g, parser = cache.load(filename, mode)
+
+    terminals, nterminals, productions = parser.symbols()
+
+    return TEMPLATE % {
+        'source': filename,
+        'mode': mode,
+        'endmarker': str(g.END),
+        'terminals': repr(tuple(terminals)),
+        'nterminals': repr(tuple(nterminals)),
+        'productions': literal(productions),
+        'end': parser.tid[g.END],
+        'lhs': repr(tuple(parser.lhs)),
+        'rhslen': repr(tuple(parser.rhslen)),
+        'action': literal(parser.action),
+        'goto': literal(parser.goto),
+        'start': parser.startset,
+    }
+
+
+@debug.log_attr(msg='MAIN', log_obj=True)
+def main():
+    filename, mode, output = sys.argv[1:4]
+
+    source = generate(filename, mode)
+    with open(output, 'w') as f:
+        f.write(source)
+
+    return 'Wrote %s.' % output
+
+
+if __name__ == '__main__':
+    main()
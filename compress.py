@@ -0,0 +1,255 @@
+"""
+Compression of the ACTION and GOTO tables of an LRParser.
+
+    default reductions  a state whose only reduction is by one production reduces by it on
+                        every terminal it cannot shift, so those entries need not be stored
+    default gotos       every non-terminal has a most common target, which is not stored
+    row deduplication   states whose remaining entries are identical share one row
+    comb packing        the sparse rows are overlapped in one next array: the entry of
+                        (row r, column c) is next[base[r] + c] if check[base[r] + c] == r
+
+Every lookup stays O(1). Default reductions may perform some reductions before an error
+is detected, but no shift is ever made on an erroneous input, so the language accepted is
+the same. The errors made by %nonassoc are stored as explicit entries, since a default
+reduction would otherwise take their place.
+"""
+
+import contextlib
+import io
+import sys
+from array import array
+from collections import Counter
+
+import cache
+import debug
+import LRParser
+
+
+def pack(rows, width):
+    """
+    Overlap sparse rows with first fit. The rows with more entries are placed first.
+
+    :param rows: a list of dicts mapping a column to a value
+    :param width: the number of columns
+    :return: base, check and next arrays
+    """
+
+    base = array('i', [0]) * len(rows)
+    check = array('i')
+    next = array('i')
+    free = 0  # No free slot before it
+
+    for r in sorted(range(len(rows)), key=lambda r: -len(rows[r])):
+        entries = rows[r]
+
+        if not entries:
+            continue
+
+        low = min(entries)
+        b = max(0, free - low)
+
+        while any(b + c < len(check) and check[b + c] != -1 for c in entries):
+            b += 1
+
+        end = b + max(entries) + 1
+        if end > len(check):
+            check.extend([-1] * (end - len(check)))
+            next.extend([0] * (end - len(next)))
+
+        for c, v in entries.items():
+            check[b + c] = r
+            next[b + c] = v
+        base[r] = b
+
+        while free < len(check) and check[free] != -1:
+            free += 1
+
+    # Any column of any row stays in range
+    end = max(base, default=0) + width
+    if end > len(check):
+        check.extend([-1] * (end - len(check)))
+        next.extend([0] * (end - len(next)))
+
+    return base, check, next
+
+
+def dedup(rows, defaults):
+    """
+
+    :param rows: a list of dicts
+    :param defaults: the default entry of every row
+    :return: the id of the unique row of every row, the unique rows and their defaults
+    """
+
+    index = {}
+    unique = []
+    unique_defaults = array('i')
+    ids = array('i')
+
+    for row, default in zip(rows, defaults):
+        k = (default, tuple(sorted(row.items())))
+        if k not in index:
+            index[k] = len(unique)
+            unique.append(row)
+            unique_defaults.append(default)
+        ids.append(index[k])
+
+    return ids, unique, unique_defaults
+
+
+class CompressedTables(object):
+    """
+    The compressed tables of an LRParser, with the same parse interface.
+    """
+
+    def __init__(self, parser):
+        self.tid = parser.tid
+        self.lhs = parser.lhs
+        self.rhslen = parser.rhslen
+        self.startset = parser.startset
+        self.nterminals = len(parser.terminals)
+        self.nnterminals = len(parser.nterminals)
+        self.dense = len(parser.action) * (self.nterminals + self.nnterminals)
+
+        rows = []
+        defaults = array('i')
+
+        for state, row in enumerate(parser.action):
+            reductions = {code for code in row if code < LRParser.ACCEPT}
+            default = reductions.pop() if len(reductions) == 1 else LRParser.ERROR
+            defaults.append(default)
+
+            rows.append({t: code for t, code in enumerate(row)
+                         if code != LRParser.ERROR and code != default or (state, t) in parser.nonassoc})
+
+        self.arows, unique, self.adefault = dedup(rows, defaults)
+        self.abase, self.acheck, self.anext = pack(unique, self.nterminals)
+
+        self.gdefault = array('i', [LRParser.NO_GOTO]) * self.nnterminals
+        for nt in range(self.nnterminals):
+            counts = Counter(row[nt] for row in parser.goto if row[nt] != LRParser.NO_GOTO)
+            if counts:
+                self.gdefault[nt] = counts.most_common(1)[0][0]
+
+        rows = [{nt: next for nt, next in enumerate(row) if next != LRParser.NO_GOTO and next != self.gdefault[nt]}
+                for row in parser.goto]
+
+        self.grows, unique, _ = dedup(rows, [LRParser.NO_GOTO] * len(rows))
+        self.gbase, self.gcheck, self.gnext = pack(unique, self.nnterminals)
+
+    def action(self, state, t):
+        r = self.arows[state]
+        i = self.abase[r] + t
+        return self.anext[i] if self.acheck[i] == r else self.adefault[r]
+
+    def goto(self, state, nt):
+        r = self.grows[state]
+        i = self.gbase[r] + nt
+        return self.gnext[i] if self.gcheck[i] == r else self.gdefault[nt]
+
+    def size(self):
+        """
+
+        :return: the number of ints stored, while the dense tables store self.dense ints
+        """
+
+        return sum(len(a) for a in (self.arows, self.adefault, self.abase, self.acheck, self.anext,
+                                    self.grows, self.gdefault, self.gbase, self.gcheck, self.gnext))
+
+    def parse(self, symbols):
+        """
+        Should be fed a symbols sequence terminated with an endmarker.
+
+        :param symbols: an iterable objcect teminated with an endmarker
+        :return: a ParseResult object, errno is 0 for success
+        """
+
+        return self.drive(LRParser.ids(self.tid, symbols))
+
+    def drive(self, tokens):
+        """
+        The shift/reduce loop of LRParser.drive over the compressed tables.
+
+        :param tokens: an iterable of terminal ids teminated with the id of the endmarker
+        :return: a ParseResult object, errno is 0 for success
+        """
+
+        arows, abase, acheck, anext, adefault = self.arows, self.abase, self.acheck, self.anext, self.adefault
+        grows, gbase, gcheck, gnext, gdefault = self.grows, self.gbase, self.gcheck, self.gnext, self.gdefault
+        lhs = self.lhs
+        rhslen = self.rhslen
+
+        state = self.startset
+        stack = [state]
+        pos = 0
+
+        for t in tokens:
+            if t < 0:
+                return LRParser.ParseResult('Unknown symbol.', -1, pos)
+            while True:
+                r = arows[state]
+                i = abase[r] + t
+                code = anext[i] if acheck[i] == r else adefault[r]
+
+                if code > 0:  # SHIFT
+                    state = code - 1
+                    stack.append(state)
+                    break
+                elif code < LRParser.ACCEPT:  # REDUCE
+                    prodno = -code - 1
+                    n = rhslen[prodno]
+                    if n:
+                        del stack[-n:]
+                    nt = lhs[prodno]
+                    r = grows[stack[-1]]
+                    i = gbase[r] + nt
+                    state = gnext[i] if gcheck[i] == r else gdefault[nt]
+                    if state == LRParser.NO_GOTO:
+                        return LRParser.ParseResult('No such transition.', -1, pos)
+                    stack.append(state)
+                elif code == LRParser.ACCEPT:
+                    return LRParser.ParseResult('Accepted.', 0, pos)
+                else:
+                    return LRParser.ParseResult('No such action.', -1, pos)
+            pos += 1
+
+        return LRParser.ParseResult('Unexpected end of input.', -1, pos)
+
+
+# Grammars and inputs on which the smaller tables must agree with the dense ones
+CHECKS = [
+    ('test-input/grammar-prec.txt', 'test-input/test-prec-input.txt'),
+    ('test-input/grammar-nonassoc-unit.txt', 'test-input/test-nonassoc-unit-input.txt'),
+]
+
+
+@debug.log_attr(msg='MAIN', log_obj=True)
+def main():
+    checks = [tuple(sys.argv[1:3])] if len(sys.argv) > 2 else CHECKS
+    count = 0
+
+    for filename, input in checks:
+        with open(input) as f:
+            lines = f.read().split()
+        count += len(lines)
+
+        for mode in cache.MODES:
+            with contextlib.redirect_stdout(io.StringIO()):
+                g, parser = cache.load(filename, mode)
+                _, bypassed = cache.load(filename, mode)
+            bypassed.eliminate_units()
+            smaller = (CompressedTables(parser), bypassed, CompressedTables(bypassed))
+
+            for line in lines:
+                symbols = [g.T[c] for c in line] + [g.END]
+                expected = parser.parse(symbols).errno
+
+                for tables in smaller:
+                    if tables.parse(symbols).errno != expected:
+                        return 'Mismatch in %s mode on %s with %s.' % (mode, line, filename)
+
+    return 'The smaller tables accept the same %d lines in every mode.' % count
+
+
+if __name__ == '__main__':
+    main()
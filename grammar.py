@@ -1,14 +1,23 @@
-from itertools import chain
-from collections import defaultdict
+from itertools import chain, count
+from collections import defaultdict, deque
 
 import re
 import debug
 
+# The name of a semantic action at the end of an alternative, a quoted "{x}" is a terminal
+ACTION = re.compile(r'^\{\w+\}$')
+
+# Precedence declarations
+ASSOCIATIVITY = {'%left': 'left', '%right': 'right', '%nonassoc': 'nonassoc'}
+
 
 class Symbol(object):
 
+    __slots__ = ('string', '_hash')
+
     def __init__(self, string):
         self.string = string
+        self._hash = hash(string)
 
     def __str__(self):
         return self.string
@@ -17,31 +26,47 @@ class Symbol(object):
         return '%s(\'%s\')' % (self.__class__.__name__, self.string)
 
     def __eq__(self, other):
-        if isinstance(other, Symbol):
+        if self is other:
+            return True
+        elif isinstance(other, Symbol):
             return self.string == other.string
         else:
             return False
 
     def __hash__(self):
-        return hash(self.string)
+        return self._hash
 
     def __ne__(self, other):
         return not self.__eq__(other)
 
 
 class Terminal(Symbol):
-    pass
+
+    __slots__ = ()
 
 
 class Production(object):
     """
     For the production deriving an epsilon notation (e.g. S->e),
     self.body is set to be an empty tuple.
+
+    Productions are interned by NTerminal.create_production, so a production is only equal to
+    itself and hashes by self.id, an integer unique in the process, since productions are hashed
+    all the time in item sets.
+    self.action is the name of the semantic action given in the grammar file, if any, and self.prec
+    the name whose precedence is given by %prec.
     """
 
+    __slots__ = ('head', 'body', 'action', 'prec', 'id')
+
+    _ids = count()
+
     def __init__(self, head, *symbols):
         self.head = head
         self.body = symbols
+        self.action = None
+        self.prec = None
+        self.id = next(Production._ids)
 
     def __str__(self):
         return '%s->%s' % (str(self.head), ''.join([str(s) for s in self]))
@@ -57,40 +82,38 @@ class Production(object):
         return self.body[index]
 
     def __hash__(self):
-        return hash(self.__str__())
+        return self.id
 
     def __len__(self):
         return self.body.__len__()
 
-    def __eq__(self, other):
-        if isinstance(other, Production):
-            return (self.head == other.head) and (self.body == other.body)
-        else:
-            return False
-
-    def __ne__(self, other):
-        return not self.__eq__(other)
-
 
 class NTerminal(Symbol):
     """
     Non-terminal class.
     """
 
+    __slots__ = ('productions', 'bodies')
+
     def __init__(self, s):
         super(NTerminal, self).__init__(s)
         self.productions = []
+        self.bodies = {}  # Map the body of every production to the production
 
     def create_production(self, *symbols):
         """
         Create a production using the given symbols.
         If no symbol is passed, a production with an empty list is created.
         That means the non-terminal derives epsilon.
+
+        Productions are interned: creating the same production twice returns the first one.
         """
 
-        p = Production(self, *symbols)
-        self.productions.append(p)
-        return p
+        if symbols not in self.bodies:
+            p = self.bodies[symbols] = Production(self, *symbols)
+            self.productions.append(p)
+
+        return self.bodies[symbols]
 
 
 class Grammar(object):
@@ -102,6 +125,12 @@ class Grammar(object):
     T = None
     START = None
     END = None
+    DROPPED = ()  # Symbols removed by self.clean
+    PRECEDENCE = {}  # Map the name of a terminal to its (level, associativity), see GrammarBuilder
+
+    # Computed once by self.productions, call self.invalidate after changing any production
+    _productions = None
+    _pid = None
 
     def nterminals(self):
         """Return non-terminals"""
@@ -114,9 +143,100 @@ class Grammar(object):
         return self.T.values()
 
     def productions(self):
-        # TODO Remove list()
+        """Return all the productions, as a tuple shared by every call."""
+
+        if self._productions is None:
+            self._productions = tuple(chain.from_iterable(sym.productions for sym in self.NT.values()))
+            self._pid = {prod: i for i, prod in enumerate(self._productions)}
+
+        return self._productions
+
+    def production_ids(self):
+        """Return a dict mapping every production to its index in self.productions(), shared by every call."""
 
-        return list(chain(*[sym.productions for sym in self.NT.values()]))
+        self.productions()
+        return self._pid
+
+    def invalidate(self):
+        self._productions = None
+        self._pid = None
+
+    def clean(self):
+        """
+        Drop the unproductive symbols, which derive no string of terminals, then the unreachable ones,
+        which no sentential form derived from the START symbol contains, together with their productions.
+        Both are worklist passes over the productions.
+
+        :return: a list of the symbols dropped
+        """
+
+        productions = [prod for nt in self.NT.values() for prod in nt.productions]
+
+        # Number of distinct non-terminals of every body not known to be productive yet
+        pending = [0] * len(productions)
+        users = defaultdict(list)
+        work = deque()
+
+        for i, prod in enumerate(productions):
+            for sym in set(prod.body):
+                if isinstance(sym, NTerminal):
+                    pending[i] += 1
+                    users[sym].append(i)
+            if not pending[i]:
+                work.append(i)
+
+        productive = set()
+        while work:
+            head = productions[work.popleft()].head
+            if head not in productive:
+                productive.add(head)
+                for i in users[head]:
+                    pending[i] -= 1
+                    if not pending[i]:
+                        work.append(i)
+
+        if self.START not in productive:
+            raise ValueError('The start symbol %s derives no string.' % self.START)
+
+        for nt in self.NT.values():
+            nt.productions[:] = [prod for prod in nt.productions
+                                 if all(sym in productive for sym in prod if isinstance(sym, NTerminal))]
+            nt.bodies = {prod.body: prod for prod in nt.productions}
+
+        reachable = {self.START, self.END}
+        work = deque([self.START])
+        while work:
+            for prod in work.popleft().productions:
+                for sym in prod:
+                    if sym not in reachable:
+                        reachable.add(sym)
+                        if isinstance(sym, NTerminal):
+                            work.append(sym)
+
+        dropped = [sym for sym in chain(self.NT.values(), self.T.values()) if sym not in reachable]
+
+        self.NT = {s: sym for s, sym in self.NT.items() if sym in reachable}
+        self.T = {s: sym for s, sym in self.T.items() if sym in reachable}
+        self.invalidate()
+
+        return dropped
+
+    def precedence(self, prod):
+        """
+        The precedence of a production is that of its %prec name, or else that of its last terminal.
+
+        :param prod:
+        :return: a (level, associativity) or None
+        """
+
+        if prod.prec is not None:
+            return self.PRECEDENCE.get(prod.prec)
+
+        for sym in reversed(prod.body):
+            if not isinstance(sym, NTerminal):
+                return self.PRECEDENCE.get(str(sym))
+
+        return None
 
 
 class GrammarBuilder(object):
@@ -126,6 +246,19 @@ class GrammarBuilder(object):
     >>> g = GrammarBuilder(filename='test-input.txt').build()
 
     If index is not specified then the left of the first production will be considered as the index symbol.
+
+    An alternative may end with the name of its semantic action in braces, see LRParser.bind:
+
+        E : E + T {add} | T ;
+
+    Precedence declarations, one per line before or between the productions, resolve shift/reduce
+    conflicts like in yacc. Every line binds tighter than the lines above it, and an alternative
+    may take the precedence of a name with %prec before its action:
+
+        %left + -
+        %left * /
+        %right UMINUS
+        E : E + E | E - E | E * E | E / E | - E %prec UMINUS | n ;
     """
 
     def __init__(self, *prods, **kwargs):
@@ -146,9 +279,22 @@ class GrammarBuilder(object):
         # TODO Make it support the yacc format
 
         raw_productions = defaultdict(list)
+        raw_actions = {}  # Map (non-terminal, index of the alternative) to the name of its action
+        raw_precs = {}  # Map (non-terminal, index of the alternative) to its %prec name
+        precedence = {}
+        level = 0
 
         i = 0
         while i < len(self.raw_lines):
+            decl = self.raw_lines[i].split()
+
+            if decl and decl[0] in ASSOCIATIVITY:
+                level += 1
+                for s in decl[1:]:
+                    precedence[s.strip('"')] = level, ASSOCIATIVITY[decl[0]]
+                i += 1
+                continue
+
             prods = ''
 
             while True:
@@ -163,9 +309,18 @@ class GrammarBuilder(object):
                 self.raw_start = nts
 
             for p in re.split(r'\s+\|\s+', bodys):
-                raw_productions[nts].append([s.strip('"') for s in p.split()])
+                raw = p.split()
+                if raw and ACTION.match(raw[-1]):
+                    raw_actions[nts, len(raw_productions[nts])] = raw.pop()[1:-1]
+                if len(raw) >= 2 and raw[-2] == '%prec':
+                    raw_precs[nts, len(raw_productions[nts])] = raw.pop().strip('"')
+                    raw.pop()
+                raw_productions[nts].append([s.strip('"') for s in raw])
 
         self.raw_productions = raw_productions
+        self.raw_actions = raw_actions
+        self.raw_precs = raw_precs
+        self.raw_precedence = precedence
 
     def is_NT_string(self, s):
         """Check if the given string is a non-terminal"""
@@ -178,13 +333,17 @@ class GrammarBuilder(object):
         if s not in self.tempd:
             if self.is_NT_string(s):
                 sym = self.tempd[s] = NTerminal(s)
-                for raw_prod in self.raw_productions[s]:
-                    sym.create_production(*[self.symbolize(c) for c in raw_prod])
+                for i, raw_prod in enumerate(self.raw_productions[s]):
+                    prod = sym.create_production(*[self.symbolize(c) for c in raw_prod])
+                    if len(sym.productions) == i:  # Interned, so an equal alternative came before
+                        raise ValueError('Duplicate production %s.' % prod)
+                    prod.action = self.raw_actions.get((s, i), prod.action)
+                    prod.prec = self.raw_precs.get((s, i), prod.prec)
             else:
                 self.tempd[s] = Terminal(s)
         return self.tempd[s]
 
-    @debug.log_attr(names=['START', 'END', 'NT', 'T'], msg='Build Grammar')
+    @debug.log_attr(names=['START', 'END', 'NT', 'T', 'DROPPED'], msg='Build Grammar')
     def build(self):
         """Begin to build a grammar object which consists of symbolize objects"""
 
@@ -196,9 +355,15 @@ class GrammarBuilder(object):
         g.START = self.symbolize(self.raw_start)
         g.END = self.symbolize(self.raw_endmarker)
 
-        g.NT = {s:obj for s, obj in self.tempd.items() if self.is_NT_string(s)}
+        # Productions are numbered in the order of the file, the START symbol first,
+        # and the alternatives of a non-terminal written twice follow its first ones
+        order = chain([self.raw_start], self.raw_productions)
+        g.NT = {s: self.tempd[s] for s in order if s in self.tempd}
         g.T = {s:obj for s, obj in self.tempd.items() if not self.is_NT_string(s)}
 
+        g.PRECEDENCE = self.raw_precedence
+        g.DROPPED = g.clean()  # Dead symbols would add states, columns and closure work to every parser
+
         return g
 
 
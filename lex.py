@@ -1,11 +1,645 @@
-import grammar
+"""
+Lexer generator: token definitions are compiled into a minimal DFA scanned by a table-driven loop.
 
+    regex -> NFA (Thompson) -> DFA (subset construction) -> minimal DFA (Hopcroft)
+
+The DFA runs over bytes: strings are encoded in UTF-8, and a character class ranges over bytes.
+Bytes are grouped into classes that no regex tells apart, so a row of the table has one entry per class.
+The longest match wins, and of the rules matching the same length the one defined first.
+
+>>> lexer = Lex([('i', r'[a-z]\\w*|\\d+'), ('+', r'\\+'), (None, r'\\s+')], parser)
+>>> parser.drive(lexer.tokens('a + 42'))
+
+Regexes support | * + ? ( ) . [a-z] [^...] and the escapes \\d \\w \\s \\n \\t \\r \\f \\v.
+"""
+
+import sys
+from array import array
+
+import LRParser
+
+# Codes of self.accept beside terminal ids
+NO_TOKEN = -1
+SKIP = -2
+
+# Entry of a DFA row without any transition
+DEAD = -1
+
+ALL = frozenset(range(256))
+
+ESCAPES = {
+    'd': frozenset(b'0123456789'),
+    'w': frozenset(b'0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_'),
+    's': frozenset(b' \t\n\r\f\v'),
+    'n': frozenset(b'\n'),
+    't': frozenset(b'\t'),
+    'r': frozenset(b'\r'),
+    'f': frozenset(b'\f'),
+    'v': frozenset(b'\v'),
+}
+
+
+class LexError(LRParser.BaseParseException):
+    def __init__(self, msg, errno, pos):
+        super(LexError, self).__init__(msg, errno)
+        self.pos = pos  # Offset of the first byte no token matches
+
+
+class NFA(object):
+    """
+    Thompson NFA. A state has epsilon moves and moves on sets of bytes.
+    A fragment is a pair of its start and its end state.
+    """
+
+    def __init__(self):
+        self.eps = []
+        self.moves = []
+        self.accept = {}  # Map an end state to the index of its rule
+
+    def state(self):
+        self.eps.append([])
+        self.moves.append([])
+        return len(self.eps) - 1
+
+    def match(self, bytes):
+        s, e = self.state(), self.state()
+        self.moves[s].append((bytes, e))
+        return s, e
+
+    def empty(self):
+        s, e = self.state(), self.state()
+        self.eps[s].append(e)
+        return s, e
+
+    def concat(self, a, b):
+        self.eps[a[1]].append(b[0])
+        return a[0], b[1]
+
+    def union(self, a, b):
+        s, e = self.state(), self.state()
+        self.eps[s] += [a[0], b[0]]
+        self.eps[a[1]].append(e)
+        self.eps[b[1]].append(e)
+        return s, e
+
+    def repeat(self, a, least, most):
+        """
+        :param a: a fragment
+        :param least: 0 or 1
+        :param most: 1 or None for any
+        :return: the fragment of a*, a+ or a?
+        """
+
+        s, e = self.state(), self.state()
+        self.eps[s].append(a[0])
+        self.eps[a[1]].append(e)
+        if least == 0:
+            self.eps[s].append(e)
+        if most is None:
+            self.eps[a[1]].append(a[0])
+        return s, e
+
+    def closure(self, states):
+        stack = list(states)
+        result = set(stack)
+        while stack:
+            for t in self.eps[stack.pop()]:
+                if t not in result:
+                    result.add(t)
+                    stack.append(t)
+        return frozenset(result)
+
+
+class RegexParser(object):
+    """
+    Recursive descent over a regex, building its fragment in an NFA.
+
+        union   : concat ( '|' concat )*
+        concat  : repeat*
+        repeat  : atom ( '*' | '+' | '?' )*
+        atom    : '(' union ')' | '[' class ']' | '.' | escape | char
+    """
+
+    def __init__(self, nfa, text):
+        self.nfa = nfa
+        self.text = text
+        self.i = 0
+
+    def error(self, msg):
+        return ValueError('%s at %d in regex %r' % (msg, self.i, self.text))
+
+    def peek(self):
+        return self.text[self.i] if self.i < len(self.text) else None
+
+    def take(self):
+        c = self.peek()
+        if c is None:
+            raise self.error('Unexpected end')
+        self.i += 1
+        return c
+
+    def parse(self):
+        frag = self.union()
+        if self.peek() is not None:
+            raise self.error('Unbalanced )')
+        return frag
+
+    def union(self):
+        frag = self.concat()
+        while self.peek() == '|':
+            self.i += 1
+            frag = self.nfa.union(frag, self.concat())
+        return frag
+
+    def concat(self):
+        frag = None
+        while self.peek() not in (None, '|', ')'):
+            next = self.repeat()
+            frag = next if frag is None else self.nfa.concat(frag, next)
+        return frag or self.nfa.empty()
+
+    def repeat(self):
+        frag = self.atom()
+        while self.peek() in ('*', '+', '?'):
+            c = self.take()
+            frag = self.nfa.repeat(frag, 1 if c == '+' else 0, 1 if c == '?' else None)
+        return frag
+
+    def atom(self):
+        c = self.take()
+
+        if c == '(':
+            frag = self.union()
+            if self.peek() != ')':
+                raise self.error('Missing )')
+            self.i += 1
+            return frag
+        elif c == '[':
+            return self.nfa.match(self.bracket())
+        elif c == '.':
+            return self.nfa.match(ALL - ESCAPES['n'])
+        elif c == '\\':
+            return self.nfa.match(self.escape())
+        elif c in '*+?)':
+            raise self.error('Nothing to repeat' if c != ')' else 'Unbalanced )')
+
+        frag = None  # A character beyond ASCII is the sequence of its UTF-8 bytes
+        for b in c.encode('utf-8'):
+            next = self.nfa.match(frozenset((b,)))
+            frag = next if frag is None else self.nfa.concat(frag, next)
+        return frag
+
+    def escape(self):
+        c = self.take()
+        return ESCAPES.get(c) or self.byte(c)
+
+    def byte(self, c):
+        if ord(c) > 255:
+            raise self.error('Character class beyond bytes')
+        return frozenset((ord(c),))
+
+    def bracket(self):
+        negate = self.peek() == '^'
+        if negate:
+            self.i += 1
+
+        result = set()
+        first = True
+        while first or self.peek() != ']':
+            first = False
+            c = self.take()
+            low = self.escape() if c == '\\' else self.byte(c)
+
+            if self.peek() == '-' and self.i + 1 < len(self.text) and self.text[self.i + 1] != ']':
+                self.i += 1
+                c = self.take()
+                high = self.escape() if c == '\\' else self.byte(c)
+                if len(low) != 1 or len(high) != 1 or min(low) > min(high):
+                    raise self.error('Bad range')
+                low = range(min(low), min(high) + 1)
+            result.update(low)
+        self.i += 1
+
+        return ALL - result if negate else frozenset(result)
+
+
+def byte_classes(sets):
+    """
+    Partition the bytes so that every set is a union of classes.
+
+    :param sets: an iterable of sets of bytes
+    :return: an array mapping a byte to its class and the number of classes
+    """
+
+    signature = [[] for _ in range(256)]
+    for k, s in enumerate(sets):
+        for b in s:
+            signature[b].append(k)
+
+    index = {}
+    classes = array('i', [0]) * 256
+    for b in range(256):
+        classes[b] = index.setdefault(tuple(signature[b]), len(index))
+
+    return classes, len(index)
+
+
+def hopcroft(rows, accept, nclasses):
+    """
+    Merge equivalent states of a complete DFA with Hopcroft's partition refinement.
+    States are first split by their accept codes.
+
+    :param rows: the next state of every state on every class
+    :param accept: the accept code of every state
+    :param nclasses:
+    :return: the block of every state
+    """
+
+    inverse = [[[] for _ in range(nclasses)] for _ in rows]
+    for s, row in enumerate(rows):
+        for c, t in enumerate(row):
+            inverse[t][c].append(s)
+
+    blocks = {}
+    for s, code in enumerate(accept):
+        blocks.setdefault(code, set()).add(s)
+    blocks = list(blocks.values())
+
+    block = [0] * len(rows)
+    for k, states in enumerate(blocks):
+        for s in states:
+            block[s] = k
+
+    work = set(range(len(blocks)))
+
+    while work:
+        a = work.pop()
+        splitter = list(blocks[a])
+
+        for c in range(nclasses):
+            x = {s for t in splitter for s in inverse[t][c]}
+
+            touched = {}
+            for s in x:
+                touched.setdefault(block[s], set()).add(s)
+
+            for k, inside in touched.items():
+                if len(inside) == len(blocks[k]):
+                    continue
+
+                blocks[k] -= inside
+                blocks.append(inside)
+                new = len(blocks) - 1
+                for s in inside:
+                    block[s] = new
+
+                if k in work:
+                    work.add(new)
+                else:
+                    work.add(new if len(inside) <= len(blocks[k]) else k)
+
+    return block
 
 
 class Lex(object):
-    # TODO Implement lexical analyser
-    pass
+    """
+    A lexer compiled from rules, which are pairs of a terminal name and a regex.
+    A rule named None skips what it matches, e.g. white spaces.
+
+    self.table[state][class] is the next state or DEAD, self.classes[byte] is the class of a byte,
+    self.accept[state] is the terminal id a state accepts, NO_TOKEN or SKIP.
+    """
+
+    def __init__(self, rules, parser=None):
+        """
+
+        :param rules: a list of (name, regex)
+        :param parser: an LRParser or a Tables object whose terminal ids are emitted,
+                       the rule indices are emitted without it
+        """
+
+        codes = []
+        if parser is not None:
+            names = {str(sym): i for sym, i in parser.tid.items()}
+            self.end = parser.end
+        else:
+            self.end = len(rules)
+
+        for k, (name, regex) in enumerate(rules):
+            if name is None:
+                codes.append(SKIP)
+            elif parser is None:
+                codes.append(k)
+            elif name in names:
+                codes.append(names[name])
+            else:
+                raise ValueError('Unknown terminal %s.' % name)
+
+        nfa = NFA()
+        start = nfa.state()
+        for k, (name, regex) in enumerate(rules):
+            s, e = RegexParser(nfa, regex).parse()
+            nfa.eps[start].append(s)
+            nfa.accept[e] = k
+
+        self.build(nfa, start, codes)
+
+    def build(self, nfa, start, codes):
+        """
+        Run the subset construction and minimize the result.
+
+        :param nfa:
+        :param start: the start state of the NFA
+        :param codes: the accept code of every rule
+        :return:
+        """
+
+        self.classes, nclasses = byte_classes({bytes for moves in nfa.moves for bytes, _ in moves})
+
+        # Representative byte of every class
+        members = {}
+        for b, c in enumerate(self.classes):
+            members.setdefault(c, b)
+
+        dead = frozenset()
+        index = {dead: 0}
+        sets = [dead]
+        rows = []
+        accept = []
+
+        i = 0
+        index[nfa.closure((start,))] = 1
+        sets.append(nfa.closure((start,)))
+
+        while i < len(sets):
+            current = sets[i]
+            i += 1
+
+            rules = [nfa.accept[s] for s in current if s in nfa.accept]
+            accept.append(codes[min(rules)] if rules else NO_TOKEN)
+
+            row = []
+            for c in range(nclasses):
+                b = members[c]
+                target = nfa.closure(t for s in current for bytes, t in nfa.moves[s] if b in bytes)
+                if target not in index:
+                    index[target] = len(sets)
+                    sets.append(target)
+                row.append(index[target])
+            rows.append(row)
+
+        block = hopcroft(rows, accept, nclasses)
+
+        # Number the blocks from the start state, leaving out the dead block
+        number = {block[0]: DEAD}
+        order = []
+        for s in range(1, len(rows)):
+            if block[s] not in number:
+                number[block[s]] = len(order)
+                order.append(s)
+
+        self.start = number[block[1]]
+        if self.start == DEAD:
+            raise ValueError('No rule matches any input.')
+        self.table = [array('i', [number[block[t]] for t in rows[s]]) for s in order]
+        self.accept = array('i', [accept[s] for s in order])
+
+    def __len__(self):
+        return len(self.table)
+
+    def fill(self, tokens, pos, k=0):
+        """
+        Scan from an offset into the arrays of tokens, until they are full or the data ends.
+        The longest match first, skipped tokens are not stored.
+
+        :param tokens: a Tokens object
+        :param pos: the offset to start from
+        :param k: the index of the first token to fill
+        :return: the offset where the scan stopped
+        """
+
+        data = tokens.data
+        ids, starts, ends = tokens.tid, tokens.start, tokens.end
+        capacity = len(ids)
+
+        table = self.table
+        classes = self.classes
+        accept = self.accept
+        start = self.start
+
+        size = len(data)
+
+        while pos < size and k < capacity:
+            state = start
+            i = pos
+            code = NO_TOKEN
+            end = pos
+
+            while i < size:
+                state = table[state][classes[data[i]]]
+                if state == DEAD:
+                    break
+                i += 1
+                if accept[state] != NO_TOKEN:
+                    code = accept[state]
+                    end = i
+
+            if code == NO_TOKEN:
+                tokens.error = pos
+                break
+            if code != SKIP:
+                ids[k] = code
+                starts[k] = pos
+                ends[k] = end
+                k += 1
+            pos = end
+
+        tokens.count = k
+        return pos
+
+    def batches(self, data, capacity=4096):
+        """
+        Scan the data in batches of at most capacity tokens. The same Tokens object is refilled
+        for every batch, so the memory used does not grow with the data.
+
+        :param data: a string, or bytes or any buffer of bytes such as a memoryview or an mmap
+        :param capacity:
+        :return: an iterator of the Tokens object, stopping after the batch where tokens.error is set
+        """
+
+        tokens = Tokens(data, capacity)
+        pos = 0
+
+        while pos < len(tokens.data) and tokens.error < 0:
+            tokens.base += tokens.count
+            pos = self.fill(tokens, pos)
+            yield tokens
+
+    def tokenize(self, data, capacity=4096):
+        """
+        Scan the whole data into one Tokens object, doubling its arrays when they are full.
+
+        :param data: a string, or bytes or any buffer of bytes such as a memoryview or an mmap
+        :param capacity: the initial capacity
+        :return: a Tokens object, whose error is set if the scan has stopped early
+        """
+
+        tokens = Tokens(data, capacity)
+        pos = self.fill(tokens, 0)
+
+        while pos < len(tokens.data) and tokens.error < 0:
+            tokens.grow()
+            pos = self.fill(tokens, pos, tokens.count)
+
+        return tokens
+
+    def scan(self, data):
+        """
+        Split the data into tokens.
+
+        :param data: a string, or bytes or any buffer of bytes
+        :return: an iterator of (terminal id, start offset, end offset)
+        """
+
+        for tokens in self.batches(data):
+            for k in range(tokens.count):
+                yield tokens.tid[k], tokens.start[k], tokens.end[k]
+
+            if tokens.error >= 0:
+                raise LexError('No token matches.', -1, tokens.error)
+
+    def tokens(self, data):
+        """
+
+        :param data: a string, or bytes or any buffer of bytes
+        :return: an iterator of terminal ids terminated with the id of the endmarker, for LRParser.drive
+        """
+
+        for t, start, end in self.scan(data):
+            yield t
+        yield self.end
+
+
+class Tokens(object):
+    """
+    Tokens over a buffer, stored in preallocated arrays: token k is the terminal tid[k]
+    at the offsets [start[k], end[k]) of the data. Nothing is copied out of the data
+    until a lexeme is asked for.
+    """
+
+    def __init__(self, data, capacity=4096):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+
+        self.data = data
+        self.tid = array('i', [0]) * capacity
+        self.start = array('q', [0]) * capacity
+        self.end = array('q', [0]) * capacity
+        self.count = 0
+        self.base = 0  # Index of tid[0] in the whole token stream, see Lex.batches
+        self.error = -1  # Offset of the first byte no token matches
+
+    def __len__(self):
+        return self.count
+
+    def grow(self):
+        for a in (self.tid, self.start, self.end):
+            a.extend(a)
+
+    def ids(self):
+        """
+
+        :return: a memoryview of the terminal ids, for Session.push
+        """
+
+        return memoryview(self.tid)[:self.count]
+
+    def lexeme(self, k):
+        """
+
+        :param k: the index of a token
+        :return: a view of its bytes if the data is a memoryview, or a copy of them
+        """
+
+        return self.data[self.start[k]:self.end[k]]
+
+    def text(self, k, encoding='utf-8'):
+        return bytes(self.lexeme(k)).decode(encoding)
+
+    def location(self, offset):
+        """
+        Compute the line and the column, both from 1, of an offset. The lines are counted
+        only when asked for, reading at most a block of the data at a time.
+
+        :param offset:
+        :return: a pair of ints
+        """
+
+        line = 1
+        column = offset + 1
+        block = 1 << 20
+
+        for i in range(0, offset, block):
+            chunk = bytes(self.data[i:min(i + block, offset)])
+            n = chunk.count(b'\n')
+            if n:
+                line += n
+                column = offset - (i + chunk.rfind(b'\n'))
+
+        return line, column
+
+
+def parse(lexer, parser, data, capacity=4096):
+    """
+    Scan the data in batches and push them into a parse session,
+    so neither the tokens nor the lexemes of the whole data are ever held.
+
+    :param lexer: a Lex object built for the parser
+    :param parser: an LRParser or a Tables object
+    :param data: a string, or bytes or any buffer of bytes such as a memoryview or an mmap
+    :param capacity: the number of tokens scanned at once
+    :return: the ParseResult and the offset where the parse or the scan stopped
+    """
+
+    session = parser.session()
+
+    for tokens in lexer.batches(data, capacity):
+        result = session.push(tokens.ids())
+
+        if result is not None:
+            k = result.pos - tokens.base
+            return result, tokens.start[k] if k < tokens.count else len(tokens.data)
+
+        if tokens.error >= 0:
+            return LRParser.ParseResult('No token matches.', -1, session.pos), tokens.error
+
+    return session.finish(), len(data)
+
+
+def main():
+    import cache
+    import mmap
+
+    g, parser = cache.load('grammar1.txt', 'lalr1')
+
+    lexer = Lex([('i', r'[a-zA-Z_]\w*|\d+'), ('+', r'\+'), ('*', r'\*'), ('(', r'\('), (')', r'\)'),
+                 (None, r'\s+')], parser)
+
+    print('%d states' % len(lexer))
+
+    if len(sys.argv) < 2:
+        text = 'x1 + (y * 42) * z'
+        tokens = lexer.tokenize(text)
+        print([(str(parser.terminals[tokens.tid[k]]), tokens.text(k)) for k in range(len(tokens))])
+        print(parser.drive(lexer.tokens(text)))
+        return
+
+    with open(sys.argv[1], 'rb') as f:  # The file is scanned in place
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    result, offset = parse(lexer, parser, data)
+    print(result, 'at line %d, column %d' % Tokens(data, 0).location(offset))
 
 
 if __name__ == '__main__':
-    g = grammar.Builder(filename='input/re.txt').build()
\ No newline at end of file
+    main()
@@ -1,30 +1,34 @@
-import LRParser
+import batch
+import cache
 import debug
 import sys
-from LR1 import Parser
 
 
 @debug.log_attr(msg='MAIN', log_obj=True)
 def main():
     filename = sys.argv[1]
-    g = LRParser.AugmentedGrammarBuilder(filename=filename).build()
-    parser = Parser(g)
+    mode = sys.argv[3] if len(sys.argv) > 3 else 'lr1'
+
+    if len(sys.argv) > 4:  # Spread the lines across that many processes
+        passed, failed = batch.parse_file(filename, sys.argv[2], mode, int(sys.argv[4]))
+        return 'Passed %d test.' % passed
+
+    g, parser = cache.load(filename, mode)
 
-    with open(sys.argv[2]) as f:
-        inputs = f.read().strip().splitlines()
     passed = 0
 
-    for index, string in enumerate(inputs):
+    with open(sys.argv[2]) as f:  # Read and parse line by line
+        for index, line in enumerate(f):
 
-        symbols = [g.T[c] for c in string]
-        symbols.append(g.END)
+            session = parser.session()
 
-        try:
-            msg, no = parser.parse(symbols)
-            if no == 0:
-                passed += 1
-        except Exception as e:
-            print('-----ERROR-----Test: %d-----%s' % (index, repr(e)))
+            try:
+                session.feed(g.T[c] for c in line.rstrip('\n'))
+                msg, no = session.finish()
+                if no == 0:
+                    passed += 1
+            except Exception as e:
+                print('-----ERROR-----Test: %d-----%s' % (index, repr(e)))
 
     return 'Passed %d test.' % \
            passed
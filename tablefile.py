@@ -0,0 +1,132 @@
+"""
+Binary file format of parse tables, read in place through mmap.
+
+All the integers are little endian int32. The file consists of
+
+    header      magic, version, number of states, terminals, non-terminals, productions,
+                the start state, the number of nonassoc pairs and the size of the names section
+    action      a row of terminals for each state
+    goto        a row of non-terminals for each state
+    lhs         the non-terminal id of the head of each production
+    rhslen      the body length of each production
+    nonassoc    (state, terminal) pairs made errors by %nonassoc, see LRParser.resolve
+    names       utf-8 names of terminals, non-terminals and productions
+
+Opening a file maps it read-only: the rows handed to the parser are memoryviews into the mapping.
+Every process opening the same file shares one copy in the page cache, and nothing is deserialized.
+"""
+
+import mmap
+import struct
+import sys
+
+from array import array
+
+MAGIC = b'CLTB'
+VERSION = 2
+
+HEADER = struct.Struct('<4s8I')
+INT = array('i').itemsize
+
+NAME_SEP = '\0'
+GROUP_SEP = '\n'
+
+
+def encode_names(symbols):
+    return GROUP_SEP.join(NAME_SEP.join(names) for names in symbols).encode('utf-8')
+
+
+def decode_names(data):
+    return tuple([name for name in group.split(NAME_SEP) if name] for group in data.decode('utf-8').split(GROUP_SEP))
+
+
+def dump(parser, filename):
+    """
+    Write the tables of a parser.
+
+    :param parser: an LRParser object
+    :param filename:
+    :return:
+    """
+
+    names = encode_names(parser.symbols())
+    header = HEADER.pack(MAGIC, VERSION, len(parser.action), len(parser.terminals), len(parser.nterminals),
+                         len(parser.productions), parser.startset, len(parser.nonassoc), len(names))
+
+    with open(filename, 'wb') as f:
+        f.write(header)
+        for rows in (parser.action, parser.goto, [parser.lhs, parser.rhslen], sorted(parser.nonassoc)):
+            for row in rows:
+                f.write(ints(row).tobytes())
+        f.write(names)
+
+
+def ints(row):
+    """
+    Return the row as a little endian array('i').
+
+    :param row: an array or a memoryview of ints
+    :return:
+    """
+
+    a = array('i', row)
+    if sys.byteorder != 'little':
+        a.byteswap()
+    return a
+
+
+class TableFile(object):
+    """
+    Parse tables mapped from a file.
+
+    self.action and self.goto are lists of rows viewing the mapping,
+    so they can be given to LRParser.from_tables like the dict of LRParser.tables.
+    """
+
+    def __init__(self, filename):
+
+        with open(filename, 'rb') as f:
+            self.mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self.mapping) < HEADER.size:
+            raise ValueError('Truncated table file.')
+
+        magic, version, nstates, nterm, nnterm, nprod, start, npairs, size = HEADER.unpack_from(self.mapping)
+
+        if magic != MAGIC or version != VERSION or INT != 4:
+            raise ValueError('Unknown table file format.')
+
+        expected = HEADER.size + INT * (nstates * (nterm + nnterm) + 2 * nprod + 2 * npairs) + size
+        if len(self.mapping) != expected:
+            raise ValueError('Truncated table file.')
+
+        offset = HEADER.size
+
+        def section(count):
+            nonlocal offset
+            view = memoryview(self.mapping)[offset:offset + count * INT]
+            offset += count * INT
+            if sys.byteorder != 'little':  # Fall back to a copy on big endian machines
+                a = array('i', view.tobytes())
+                a.byteswap()
+                return memoryview(a)
+            return view.cast('i')
+
+        action = section(nstates * nterm)
+        goto = section(nstates * nnterm)
+
+        self.action = [action[i * nterm:(i + 1) * nterm] for i in range(nstates)]
+        self.goto = [goto[i * nnterm:(i + 1) * nnterm] for i in range(nstates)]
+        self.lhs = section(nprod)
+        self.rhslen = section(nprod)
+        pairs = section(2 * npairs)
+        self.nonassoc = [(pairs[2 * i], pairs[2 * i + 1]) for i in range(npairs)]
+        self.startset = start
+        self.symbols = decode_names(self.mapping[offset:offset + size])
+
+    def __getitem__(self, key):
+        """
+        Make the object usable as the dict of LRParser.tables.
+        """
+
+        return getattr(self, key)
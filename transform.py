@@ -0,0 +1,448 @@
+"""
+Transformations fitting a grammar for an LL(1) parser.
+
+    left recursion      A -> Aα | β  becomes  A -> βA', A' -> αA' | ε
+                        Indirect left recursion is first made direct by substituting the productions
+                        of the non-terminals on the cycle, in the way of the textbook algorithm, but
+                        only for non-terminals left recursive with each other.
+    left factoring      A -> αβ1 | αβ2  becomes  A -> αA', A' -> β1 | β2
+                        Productions starting with different symbols whose FIRST sets overlap,
+                        e.g. A -> B | C with B -> xα and C -> xβ, are inlined first to expose a prefix.
+
+Every production of the result keeps a build function, which computes the value of its head
+from the values of its body. The value of a non-terminal of the source grammar is its parse tree
+in the source grammar: a pair of a source production and the tuple of the values of its body.
+The value of a new non-terminal is a function completing such a tree. So whichever parser runs
+the transformed grammar, results come out in terms of the source grammar:
+
+>>> t = Transformed(g)
+>>> parser = LL1.Parser(t.grammar)
+>>> t.bind(parser)
+>>> tree = parser.evaluate(symbols).value
+
+Left recursion through a nullable prefix, e.g. A -> BA with B =>* ε, is not removed.
+"""
+
+import sys
+from collections import defaultdict, deque
+from itertools import chain
+
+import debug
+import grammar
+
+
+def first_seq(body, first, nullable):
+    """
+
+    :param body: a sequence of symbols
+    :param first: FIRST of every non-terminal
+    :param nullable: the nullable non-terminals
+    :return: FIRST of the body as a set of terminals and True if the body derives epsilon
+    """
+
+    result = set()
+    for sym in body:
+        if sym not in first:
+            result.add(sym)
+            return result, False
+        result |= first[sym]
+        if sym not in nullable:
+            return result, False
+
+    return result, True
+
+
+def identity(left):
+    return left
+
+
+def empty_tail(values):
+    return identity
+
+
+def substituted(build, sub_build, n):
+    """
+    Ai -> Aj γ with Aj -> δ substituted becomes Ai -> δγ.
+
+    :param build: the build of Ai -> Aj γ
+    :param sub_build: the build of Aj -> δ
+    :param n: the length of δ
+    :return: the build of Ai -> δγ
+    """
+
+    return lambda values: build((sub_build(values[:n]),) + values[n:])
+
+
+def recursion_head(build):
+    """
+    A -> β becomes A -> βA', where A' completes the tree of β.
+    """
+
+    return lambda values: values[-1](build(values[:-1]))
+
+
+def recursion_tail(build):
+    """
+    A -> Aα becomes A' -> αA', which puts the tree on its left under A -> Aα and hands it on.
+    """
+
+    return lambda values: lambda left: values[-1](build((left,) + values[:-1]))
+
+
+def factored_head(values):
+    """
+    A -> αA', where A' completes the tree given the values of α.
+    """
+
+    return values[-1](values[:-1])
+
+
+def factored_tail(build):
+    """
+    A -> αβ becomes A' -> β, which completes the tree of A -> αβ given the values of α.
+    """
+
+    return lambda values: lambda prefix: build(prefix + values)
+
+
+class Transformed(object):
+    """
+    The grammar without left recursion and left factored.
+
+    self.grammar is the new grammar, whose non-terminals and productions are new objects,
+    self.builds maps every new production to its build function and self.origin maps it to the
+    source production it comes from, or None for the productions introduced by a transformation.
+    """
+
+    def __init__(self, gram):
+        self.source = gram
+        self.actions = {}  # Semantic actions of source productions, see self.bind
+        self.names = {str(sym) for sym in chain(gram.nterminals(), gram.terminals())}
+
+        # Map every non-terminal to a list of (body, build, source production)
+        self.rules = {nt: [(prod.body, self.node(prod), prod) for prod in nt.productions]
+                      for nt in gram.nterminals()}
+
+        self.remove_left_recursion()
+        self.left_factor()
+
+        self.grammar, self.builds, self.origin = self.build()
+
+    def node(self, prod):
+        """
+
+        :param prod: a source production
+        :return: the build of its tree node, or of its semantic action in self.actions
+        """
+
+        actions = self.actions
+
+        def build(values):
+            func = actions.get(prod)
+            return func(*values) if func else (prod, values)
+
+        return build
+
+    def fresh(self, nt):
+        """
+        Create a non-terminal named after nt, e.g. A'.
+
+        :param nt:
+        :return:
+        """
+
+        name = str(nt) + "'"
+        while name in self.names:
+            name += "'"
+        self.names.add(name)
+
+        sym = grammar.NTerminal(name)
+        self.rules[sym] = []
+        return sym
+
+    def left_corners(self):
+        """
+
+        :return: a dict mapping every non-terminal to the non-terminals it may derive on its left
+        """
+
+        edges = {nt: {body[0] for body, _, _ in rules if body and body[0] in self.rules}
+                 for nt, rules in self.rules.items()}
+
+        reach = {}
+        for nt in edges:
+            seen = set()
+            stack = list(edges[nt])
+            while stack:
+                sym = stack.pop()
+                if sym not in seen:
+                    seen.add(sym)
+                    stack.extend(edges[sym])
+            reach[nt] = seen
+
+        return reach
+
+    def remove_left_recursion(self):
+        reach = self.left_corners()
+        order = list(self.rules)
+
+        for i, ai in enumerate(order):
+            if ai not in reach[ai]:
+                continue
+
+            for aj in order[:i]:
+                if aj in reach[ai] and ai in reach[aj]:  # On a cycle with ai
+                    self.substitute(ai, aj)
+
+            self.remove_direct(ai)
+
+    def inline(self, rule):
+        """
+        Substitute the productions of the non-terminal starting a rule: Ai -> Aj γ becomes
+        Ai -> δγ for every production Aj -> δ.
+
+        :param rule: a (body, build, source production)
+        :return: a list of rules
+        """
+
+        body, build, origin = rule
+        return [(sub_body + body[1:], substituted(build, sub_build, len(sub_body)), origin)
+                for sub_body, sub_build, _ in self.rules[body[0]]]
+
+    def substitute(self, ai, aj):
+        """
+        Inline every production of Ai starting with Aj.
+
+        :param ai:
+        :param aj:
+        :return:
+        """
+
+        rules = []
+        for rule in self.rules[ai]:
+            if rule[0] and rule[0][0] == aj:
+                rules.extend(self.inline(rule))
+            else:
+                rules.append(rule)
+
+        self.rules[ai] = rules
+
+    def remove_direct(self, a):
+        recursive = [(body[1:], build, origin) for body, build, origin in self.rules[a] if body and body[0] == a]
+        if not recursive:
+            return
+
+        if any(not alpha for alpha, _, _ in recursive):
+            raise ValueError('Cyclic production %s->%s.' % (a, a))
+
+        tail = self.fresh(a)
+
+        self.rules[a] = [(body + (tail,), recursion_head(build), origin)
+                         for body, build, origin in self.rules[a] if not (body and body[0] == a)]
+        self.rules[tail] = [(alpha + (tail,), recursion_tail(build), origin) for alpha, build, origin in recursive]
+        self.rules[tail].append(((), empty_tail, None))
+
+    def first_sets(self):
+        """
+        Worklist-free fixpoint of FIRST and nullable over the current rules.
+
+        :return: a dict mapping every non-terminal to its FIRST as a set of terminals, and the set of nullable ones
+        """
+
+        first = {nt: set() for nt in self.rules}
+        nullable = set()
+
+        changed = True
+        while changed:
+            changed = False
+            for nt, rules in self.rules.items():
+                for body, _, _ in rules:
+                    bits, empty = first_seq(body, first, nullable)
+                    if not bits <= first[nt]:
+                        first[nt] |= bits
+                        changed = True
+                    if empty and nt not in nullable:
+                        nullable.add(nt)
+                        changed = True
+
+        return first, nullable
+
+    def expand_overlap(self, a, first, nullable, reach):
+        """
+        Find two productions of A with different first symbols but overlapping FIRST sets,
+        e.g. A -> B | C with B -> xα and C -> xβ, and inline the non-terminals starting them,
+        so that their common prefix shows up for left factoring. If one of the symbols is a left
+        corner of the other, e.g. A -> B | C with B -> Cγ, only the other one is inlined.
+
+        :param a:
+        :param first:
+        :param nullable:
+        :param reach: the left corners of every non-terminal
+        :return: True if a production has been inlined
+        """
+
+        rules = self.rules[a]
+        firsts = [first_seq(body, first, nullable)[0] for body, _, _ in rules]
+
+        for i in range(len(rules)):
+            for j in range(i + 1, len(rules)):
+                bi, bj = rules[i][0], rules[j][0]
+                if bi and bj and bi[0] == bj[0] or not firsts[i] & firsts[j]:
+                    continue
+
+                expand = [k for k in (i, j) if rules[k][0] and rules[k][0][0] in self.rules and rules[k][0][0] != a]
+                if len(expand) == 2:
+                    if bj[0] in reach[bi[0]]:
+                        expand = [i]
+                    elif bi[0] in reach[bj[0]]:
+                        expand = [j]
+                if expand:
+                    self.rules[a] = list(chain.from_iterable(
+                        self.inline(rule) if k in expand else [rule] for k, rule in enumerate(rules)))
+                    return True
+
+        return False
+
+    def left_factor(self, limit=64):
+        """
+        Left factor every non-terminal, the new ones included.
+
+        :param limit: the number of inlinings allowed for a non-terminal
+        :return:
+        """
+
+        work = deque(self.rules)
+        first, nullable = self.first_sets()
+        reach = self.left_corners()
+
+        while work:
+            a = work.popleft()
+
+            if len(first) != len(self.rules):  # New non-terminals, inlining and factoring keep FIRST otherwise
+                first, nullable = self.first_sets()
+                reach = self.left_corners()
+
+            for _ in range(limit):
+                if not self.expand_overlap(a, first, nullable, reach):
+                    break
+
+            self.factor(a, work)
+
+    def factor(self, a, work):
+        """
+        Factor the longest common prefix out of the productions of A starting with the same symbol.
+
+        :param a:
+        :param work: where the new non-terminals are appended
+        :return:
+        """
+
+        groups = defaultdict(list)
+        for rule in self.rules[a]:
+            if rule[0]:
+                groups[rule[0][0]].append(rule)
+
+        rules = []
+        for rule in self.rules[a]:
+            group = groups.get(rule[0][0]) if rule[0] else None
+
+            if not group or len(group) == 1:
+                rules.append(rule)
+                continue
+            if rule is not group[0]:  # Factored with the first one
+                continue
+
+            n = 1
+            while all(len(body) > n and body[n] == group[0][0][n] for body, _, _ in group):
+                n += 1
+
+            tail = self.fresh(a)
+            rules.append((group[0][0][:n] + (tail,), factored_head, None))
+            self.rules[tail] = [(body[n:], factored_tail(build), origin) for body, build, origin in group]
+            work.append(tail)
+
+        self.rules[a] = rules
+
+    def build(self):
+        """
+        Create the new grammar.
+
+        :return: the grammar, the builds and the origins of its productions
+        """
+
+        source = self.source
+
+        reachable = {source.START}  # Inlined non-terminals may be left unused
+        stack = [source.START]
+        while stack:
+            for body, _, _ in self.rules[stack.pop()]:
+                for sym in body:
+                    if sym in self.rules and sym not in reachable:
+                        reachable.add(sym)
+                        stack.append(sym)
+
+        nts = {nt: grammar.NTerminal(str(nt)) for nt in self.rules if nt in reachable}
+
+        builds = {}
+        origin = {}
+
+        for nt, new_nt in nts.items():
+            for body, build, prod in self.rules[nt]:
+                new = new_nt.create_production(*[nts.get(sym, sym) for sym in body])
+                if new not in builds:  # The first of equal productions is kept
+                    builds[new] = build
+                    origin[new] = prod
+
+        g = grammar.Grammar()
+        g.START = nts[source.START]
+        g.END = source.END
+        g.NT = {str(nt): nt for nt in nts.values()}
+        g.T = dict(source.T)
+        g.PRECEDENCE = source.PRECEDENCE
+
+        if getattr(source, 'START_PROD', None) is not None and len(g.START.productions) == 1:
+            g.START_PROD = g.START.productions[0]
+
+        return g, builds, origin
+
+    def bind(self, parser, actions=None):
+        """
+        Register the builds as the semantic actions of a parser of self.grammar,
+        so that its result is the value of the start symbol in the source grammar.
+
+        :param parser: an LRParser or an LL1.Parser built from self.grammar
+        :param actions: a dict mapping source productions to their semantic actions,
+                        which replace the tree nodes of these productions
+        :return:
+        """
+
+        self.actions.clear()
+        self.actions.update(actions or {})
+
+        for prod, build in self.builds.items():
+            parser.semantic(prod, lambda *values, build=build: build(values))
+
+
+@debug.log_attr(msg='MAIN', log_obj=True)
+def main():
+    import LL1
+    import LRParser
+
+    filename = sys.argv[1] if len(sys.argv) > 1 else 'grammar2.txt'
+    g = LRParser.AugmentedGrammarBuilder(filename=filename).build()
+
+    t = Transformed(g)
+
+    for prod in t.grammar.productions():
+        print('%-40s from %s' % (prod, t.origin[prod]))
+
+    try:
+        LL1.Parser(t.grammar)
+    except LRParser.ParseError as e:
+        return e.msg
+
+    return 'The transformed grammar is LL(1).'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+Parse trees stored in flat arrays instead of nested node objects.
+
+Node i of a Tree is
+
+    a leaf      label[i] = -1 - terminal id, first[i] = index of its symbol in the input, count[i] = 0
+    an inner    label[i] = production id, its children are kids[first[i]:first[i] + count[i]]
+
+Nodes are appended as they are completed, that is in postorder, so children always come
+before their parent and the root is the last node. Building a tree allocates no object
+per node: a node is three ints appended to arrays.
+
+>>> result = tree.parse(parser, symbols)
+>>> print(result.value.format(parser))
+
+Productions bypassed by LRParser.eliminate_units leave no node, which makes the tree smaller still.
+"""
+
+from array import array
+
+import LRParser
+
+
+class Tree(object):
+
+    def __init__(self):
+        self.label = array('i')
+        self.first = array('i')
+        self.count = array('i')
+        self.kids = array('i')
+
+    def __len__(self):
+        return len(self.label)
+
+    @property
+    def root(self):
+        return len(self.label) - 1
+
+    def leaf(self, t, pos):
+        """
+        Append a leaf.
+
+        :param t: the terminal id
+        :param pos: the index of the symbol in the input
+        :return: the id of the node
+        """
+
+        self.label.append(-1 - t)
+        self.first.append(pos)
+        self.count.append(0)
+        return len(self.label) - 1
+
+    def node(self, prodno, children):
+        """
+        Append an inner node.
+
+        :param prodno: the production id
+        :param children: the ids of the children
+        :return: the id of the node
+        """
+
+        self.label.append(prodno)
+        self.first.append(len(self.kids))
+        self.count.append(len(children))
+        self.kids.extend(children)
+        return len(self.label) - 1
+
+    def is_leaf(self, i):
+        return self.label[i] < 0
+
+    def terminal(self, i):
+        """
+
+        :param i: a leaf
+        :return: the terminal id
+        """
+
+        return -1 - self.label[i]
+
+    def children(self, i):
+        first = self.first[i]
+        return self.kids[first:first + self.count[i]]
+
+    def format(self, parser, i=None):
+        """
+        Render a subtree as nested text such as E(T(F(i)) + F(i)), naming inner nodes by their heads.
+        The texts are built in node order since the children of a node always come before it.
+
+        :param parser: the LRParser the tree was built with
+        :param i: the root of the subtree, the root of the tree by default
+        :return: a string
+        """
+
+        i = self.root if i is None else i
+        text = []
+
+        for n in range(i + 1):
+            if self.is_leaf(n):
+                text.append(str(parser.terminals[self.terminal(n)]))
+            else:
+                head = parser.nterminals[parser.lhs[self.label[n]]]
+                text.append('%s(%s)' % (head, ' '.join(text[c] for c in self.children(n))))
+
+        return text[i]
+
+
+def drive(parser, tokens):
+    """
+    The loop of LRParser.drive building a Tree. The value stack holds node ids.
+
+    :param parser: an LRParser or a Tables object
+    :param tokens: an iterable of terminal ids teminated with the id of the endmarker
+    :return: a ParseResult object whose value is the Tree
+    """
+
+    action = parser.action
+    goto = parser.goto
+    lhs = parser.lhs
+    rhslen = parser.rhslen
+
+    tree = Tree()
+    label, first, count, kids = tree.label, tree.first, tree.count, tree.kids
+
+    state = parser.startset
+    stack = [state]
+    vstack = []
+    pos = 0
+
+    for t in tokens:
+        if t < 0:
+            return LRParser.ParseResult('Unknown symbol.', -1, pos)
+        while True:
+            code = action[state][t]
+
+            if code > 0:  # SHIFT
+                state = code - 1
+                stack.append(state)
+                vstack.append(len(label))
+                label.append(-1 - t)
+                first.append(pos)
+                count.append(0)
+                break
+            elif code < LRParser.ACCEPT:  # REDUCE
+                prodno = -code - 1
+                n = rhslen[prodno]
+                first.append(len(kids))
+                if n:
+                    kids.extend(vstack[-n:])
+                    del stack[-n:]
+                    del vstack[-n:]
+                vstack.append(len(label))
+                label.append(prodno)
+                count.append(n)
+                state = goto[stack[-1]][lhs[prodno]]
+                if state == LRParser.NO_GOTO:
+                    return LRParser.ParseResult('No such transition.', -1, pos)
+                stack.append(state)
+            elif code == LRParser.ACCEPT:  # The root is the node of the START production
+                tree.node(0, vstack)
+                return LRParser.ParseResult('Accepted.', 0, pos, tree)
+            else:
+                return LRParser.ParseResult('No such action.', -1, pos)
+        pos += 1
+
+    return LRParser.ParseResult('Unexpected end of input.', -1, pos)
+
+
+def parse(parser, symbols):
+    """
+
+    :param parser: an LRParser or a Tables object
+    :param symbols: an iterable objcect teminated with an endmarker
+    :return: a ParseResult object whose value is the Tree
+    """
+
+    return drive(parser, LRParser.ids(parser.tid, symbols))